@@ -1,6 +1,8 @@
 #%%
 import requests
 import os
+import time
+import threading
 from dotenv import load_dotenv
 import pandas as pd
 
@@ -12,24 +14,47 @@ load_dotenv()
 api_id = os.getenv('HP_APP_ID') 
 app_secret  = os.getenv('HP_APP_SECRET')
 
+# Cached access token, shared by every request made by this module
+_token_cache = {"token": None, "expires_at": 0.0}
+_token_lock = threading.Lock()
+TOKEN_REFRESH_MARGIN = 60  # Renew the token this many seconds before it expires
+
 # Get access to the API
-def get_oauth_token():
-    """Gets OAuth access token using app credentials"""
-    token_url = "https://api.helpscout.net/v2/oauth2/token"
-    
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": api_id,
-        "client_secret": app_secret
-    }
-    
-    response = requests.post(token_url, data=data)
-    if response.status_code == 200:
-        return response.json()["access_token"]
-    else:
-        print(f"Error getting token: {response.status_code}")
-        print(f"Response: {response.text}")
-        return None
+def get_oauth_token(force_refresh=False):
+    """Gets OAuth access token using app credentials, reusing it until it expires"""
+    with _token_lock:
+        if (not force_refresh and _token_cache["token"]
+                and time.monotonic() < _token_cache["expires_at"] - TOKEN_REFRESH_MARGIN):
+            return _token_cache["token"]
+
+        token_url = "https://api.helpscout.net/v2/oauth2/token"
+        
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": api_id,
+            "client_secret": app_secret
+        }
+        
+        response = requests.post(token_url, data=data)
+        if response.status_code == 200:
+            payload = response.json()
+            _token_cache["token"] = payload["access_token"]
+            _token_cache["expires_at"] = time.monotonic() + float(payload.get("expires_in", 7200))
+            return _token_cache["token"]
+        else:
+            print(f"Error getting token: {response.status_code}")
+            print(f"Response: {response.text}")
+            _token_cache["token"] = None
+            return None
+
+def authorized_get(url, params=None):
+    """GET request with the cached token; renews the token once if it was rejected (401)"""
+    headers = {"Authorization": f"Bearer {get_oauth_token()}"}
+    response = requests.get(url, headers=headers, params=params)
+    if response.status_code == 401:
+        headers = {"Authorization": f"Bearer {get_oauth_token(force_refresh=True)}"}
+        response = requests.get(url, headers=headers, params=params)
+    return response
 
 # Create a fucntion to retrieve conversations info ('metadata') based on tags
 def get_conversations_by_tag(tag_name):
@@ -47,16 +72,11 @@ def get_conversations_by_tag(tag_name):
         "page": 1
     }
     
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
     all_conversations = []
     
     # Keep fetching until no more 'next' link
     while True:
-        response = requests.get(url, headers=headers, params=params)
+        response = authorized_get(url, params=params)
         if response.status_code != 200:
             break
             
@@ -77,10 +97,9 @@ def get_conversations_by_tag(tag_name):
 def get_threads_by_tag(tag_name):
     """Gets all threads from conversations with a specific tag name."""
     token = get_oauth_token()
+    if not token:
+        return []
     base_url = "https://api.helpscout.net/v2"
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
     # Step 1: List conversations with the tag
     conversations_url = f"{base_url}/conversations"
     params = {
@@ -94,7 +113,7 @@ def get_threads_by_tag(tag_name):
 
     # Keep fetching until no more 'next' link
     while True:
-        response = requests.get(conversations_url, headers=headers, params=params)
+        response = authorized_get(conversations_url, params=params)
         if response.status_code != 200:
             break
             
@@ -107,7 +126,7 @@ def get_threads_by_tag(tag_name):
             conv_number = conv.get('number')
             
             threads_url = f"{base_url}/conversations/{conv_id}/threads"
-            thread_resp = requests.get(threads_url, headers=headers)
+            thread_resp = authorized_get(threads_url)
             
             if thread_resp.status_code == 200:
                 threads_data = thread_resp.json().get('_embedded', {}).get('threads', [])
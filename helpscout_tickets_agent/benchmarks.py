@@ -0,0 +1,209 @@
+#%% # Micro-benchmarks for the ETL hot spots
+"""
+Each section compares the current implementation with the previous one (kept
+here as a reference), checks that both produce the same output on the stored
+data and prints the throughput. Run the whole file or cell by cell.
+"""
+import re
+import time
+import pandas as pd
+
+THREADS_CSV = 'data/filtered_threads.csv'
+
+
+def timed(fn, *args, repeat=3):
+    """Runs fn(*args) `repeat` times; returns (best time in seconds, last result)."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started_at)
+    return best, result
+
+
+def print_rate(label, seconds, rows, unit="rows"):
+    print(f"  {label:<28} {seconds:8.3f}s  {rows / seconds:12,.0f} {unit}/sec")
+
+#%% # Text cleaning: remove_signature + clean_body
+from text_processing import clean_message
+
+
+def legacy_remove_signature(text: str) -> str:
+    """remove_signature as it was: pattern rebuilt and compiled on every call."""
+    text = str(text)
+    farewell_words = (
+        r"best|regards|kind regards|warm regards|sincerely|thanks|thank you|cheers|respectfully|"
+        r"yours truly|yours sincerely|yours faithfully|take care|atenciosamente|obrigado|agradeço|abs"
+    )
+    common_titles = (
+        r"manager|analyst|engineer|developer|designer|director|ceo|cto|founder|consultant|"
+        r"coordinator|president|gerente|assistant|controller|accountant"
+    )
+    pattern = (
+        rf"(?i)(?:^|\n)[ \t]*({farewell_words})[^\n]*\n"
+        rf"(?:.*({common_titles}).*\n*){{0,3}}"
+    )
+    text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
+    return text.strip()
+
+
+def legacy_clean_body(text: str) -> str:
+    """clean_body as it was: five separate passes with uncompiled patterns."""
+    text = str(text)
+    text = re.sub(r"https?://\S+", "", text)
+    text = re.sub(r"[\w\.-]+@[\w\.-]+", "", text)
+    text = re.sub(r"\(?\d{2,3}\)?[\s-]?\d{3,5}[\s-]?\d{4}", "", text)
+    text = re.sub(r"\s{2,}", " ", text)
+    text = text.replace("\n", " ").replace("\r", "")
+    return text.strip()
+
+
+def benchmark_cleaning(csv_path=THREADS_CSV, repeat=3):
+    bodies = pd.read_csv(csv_path)['body']
+    print(f"Text cleaning on {len(bodies)} rows from {csv_path}")
+
+    legacy_time, legacy = timed(
+        lambda s: s.astype(str).map(lambda text: legacy_clean_body(legacy_remove_signature(text))),
+        bodies, repeat=repeat
+    )
+    row_time, per_row = timed(lambda s: s.astype(str).map(clean_message), bodies, repeat=repeat)
+
+    assert per_row.tolist() == legacy.tolist(), "clean_message output differs from the legacy functions"
+    print("  ✓ Identical output")
+    print_rate("legacy (per row)", legacy_time, len(bodies))
+    print_rate("clean_message (per row)", row_time, len(bodies))
+    print(f"  Speedup: {legacy_time / row_time:.2f}x")
+
+#%% # HTML to text: BeautifulSoup html.parser vs stream / lxml backends
+import html
+import random
+from text_processing import lxml, html_process_pool, strip_html_many
+
+RAW_THREADS_CSV = 'data/raw_threads.csv'  # written by etl.py with SAVE_RAW_THREADS = True
+
+
+def synthetic_html_bodies(csv_path=THREADS_CSV, seed=0):
+    """Wraps the stored plain-text bodies in Help Scout-like markup (used when no raw dump exists)."""
+    rng = random.Random(seed)
+    bodies = []
+    for text in pd.read_csv(csv_path)['body'].astype(str):
+        words = []
+        for i, word in enumerate(html.escape(text).split(' ')):
+            roll = rng.random()
+            if roll < 0.05:
+                words.append('<br>')
+            elif roll < 0.08:
+                word = f'<a href="https://example.com/{i}">{word}</a>'
+            elif roll < 0.10:
+                words.append('&nbsp;')
+            words.append(word)
+        bodies.append(
+            f'<div dir="ltr"><p>{" ".join(words)}</p>'
+            '<div class="gmail_quote"><span style="color:#555">Sent&#160;from my phone</span></div></div>'
+        )
+    return bodies
+
+
+def load_html_bodies(csv_path=RAW_THREADS_CSV):
+    try:
+        bodies = pd.read_csv(csv_path)['body'].dropna().astype(str).tolist()
+        print(f"HTML to text on {len(bodies)} stored bodies from {csv_path}")
+    except FileNotFoundError:
+        bodies = synthetic_html_bodies()
+        print(f"{csv_path} not found (run etl.py with SAVE_RAW_THREADS = True); "
+              f"using {len(bodies)} synthetic bodies built from {THREADS_CSV}")
+    return bodies
+
+
+def benchmark_html(csv_path=RAW_THREADS_CSV, n_process=4, repeat=3):
+    bodies = load_html_bodies(csv_path)
+
+    reference_time, reference = timed(strip_html_many, bodies, "bs4", repeat=repeat)
+    print_rate("bs4 html.parser (reference)", reference_time, len(bodies))
+
+    backends = ["stream"] + (["lxml"] if lxml is not None else [])
+    for backend in backends:
+        backend_time, result = timed(strip_html_many, bodies, backend, repeat=repeat)
+        mismatches = sum(a != b for a, b in zip(result, reference))
+        print_rate(f"{backend}", backend_time, len(bodies))
+        print(f"    identical: {len(bodies) - mismatches}/{len(bodies)}, "
+              f"speedup: {reference_time / backend_time:.2f}x")
+
+    with html_process_pool(n_process) as executor:
+        strip_html_many(bodies[:n_process], executor=executor)  # start the workers
+        pool_time, result = timed(lambda: strip_html_many(bodies, executor=executor), repeat=repeat)
+    assert result == strip_html_many(bodies), "process pool changed the output"
+    print_rate(f"stream x {n_process} processes", pool_time, len(bodies))
+    print(f"    speedup: {reference_time / pool_time:.2f}x")
+
+#%% # group_threads: per-group sort + iterrows vs one sort + one aggregation
+from help_functions import group_threads
+
+
+def legacy_group_threads(df: pd.DataFrame) -> dict:
+    """group_threads as it was: sort_values inside each group and iterrows per message."""
+    texto_conversas = {}
+    df_filtrado = df.dropna(subset=['normalized'])
+    df_filtrado = df_filtrado[df_filtrado['normalized'].str.strip() != ""]
+    for conv_id, group in df_filtrado.groupby('conversation_id'):
+        sorted_group = group.sort_values(by='createdAt')
+        msgs = [
+            f"{row['author']} em {row['createdAt']} ({row['type']}):\n{row['normalized']}\n"
+            for idx, row in sorted_group.iterrows()
+        ]
+        texto_conversas[conv_id] = "\n".join(msgs).strip()
+    return texto_conversas
+
+
+def scaled_threads(csv_path=THREADS_CSV, factor=10, seed=0):
+    """Repeats the stored threads `factor` times under new conversation ids, in shuffled order."""
+    df = pd.read_csv(csv_path).rename(columns={'body': 'normalized'})
+    offset = int(df['conversation_id'].max()) + 1
+    copies = [df.assign(conversation_id=df['conversation_id'] + i * offset) for i in range(factor)]
+    return pd.concat(copies, ignore_index=True).sample(frac=1, random_state=seed)
+
+
+def benchmark_group_threads(csv_path=THREADS_CSV, factor=10, repeat=3):
+    df = scaled_threads(csv_path, factor)
+    print(f"group_threads on {len(df)} rows / {df['conversation_id'].nunique()} conversations "
+          f"({factor}x {csv_path})")
+
+    legacy_time, legacy = timed(legacy_group_threads, df, repeat=repeat)
+    new_time, vectorized = timed(group_threads, df, repeat=repeat)
+
+    # The legacy per-group sort_values (quicksort) is not stable, so messages sharing a
+    # createdAt could come out in any order; those conversations are compared as sets
+    tied = set(df.loc[df.duplicated(['conversation_id', 'createdAt']), 'conversation_id'])
+    assert list(vectorized) == list(legacy), "group_threads changed the conversations"
+    for conv_id, text in legacy.items():
+        if conv_id in tied:
+            assert sorted(vectorized[conv_id].split("\n\n")) == sorted(text.split("\n\n")), conv_id
+        else:
+            assert vectorized[conv_id] == text, f"group_threads output differs for {conv_id}"
+    print(f"  ✓ Identical output ({len(tied)} conversations with timestamp ties compared as sets)")
+    print_rate("legacy (groupby + iterrows)", legacy_time, len(df))
+    print_rate("vectorized", new_time, len(df))
+    print(f"  Speedup: {legacy_time / new_time:.2f}x")
+
+#%% # Semantic search latency over the Chroma store (built by datastore.py)
+CONVERSATIONS_CSV = 'data/threads_by_convo.csv'
+
+
+def benchmark_semantic_search(csv_path=CONVERSATIONS_CSV, n_queries=20, repeat=3):
+    from semantic_search import SemanticSearch, benchmark_search
+
+    searcher = SemanticSearch()
+    if not searcher.conversations.count():
+        print("Semantic search: the Chroma store is empty (run datastore.py first), skipped")
+        return
+    # The opening of stored conversations stands in for what an agent would type
+    queries = pd.read_csv(csv_path)['texto_completo'].astype(str).str[:300].head(n_queries).tolist()
+    benchmark_search(queries, searcher, repeat=repeat)
+
+#%% # Run all benchmarks
+if __name__ == "__main__":
+    benchmark_cleaning()
+    benchmark_html()
+    benchmark_group_threads()
+    benchmark_semantic_search()
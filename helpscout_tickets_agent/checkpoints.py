@@ -0,0 +1,109 @@
+"""
+Checkpoints for the workflow graph (workflow_graph.py).
+
+A local SQLite file keeps the outputs of finished nodes (pickled) and every
+summary and tag list as soon as it is produced. A run started with `--resume`
+reads them back: finished nodes are skipped and the summarize/tagging nodes
+only process the conversations that are not done yet, so an interrupted run
+continues where it stopped instead of repeating hours of LLM work.
+"""
+import pickle
+import time
+
+from sqlite_store import SQLiteStore
+
+CHECKPOINT_PATH = 'data/workflow_checkpoint.sqlite'
+
+
+class WorkflowCheckpoint(SQLiteStore):
+    """
+    SQLite store for node outputs and per-conversation results.
+    Every result is committed as it arrives; synchronous=NORMAL keeps those
+    small commits cheap (WAL still survives a crash of the process).
+
+    Args:
+        path (str): SQLite file
+    """
+
+    pragmas = ("synchronous=NORMAL",)
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        super().__init__(path)
+
+    def _create_schema(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            " node TEXT PRIMARY KEY, payload BLOB NOT NULL, completed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " stage TEXT NOT NULL, conversation_id TEXT NOT NULL, value BLOB NOT NULL,"
+            " completed_at REAL NOT NULL, PRIMARY KEY (stage, conversation_id))"
+        )
+
+    def save_node(self, node, outputs):
+        """Store the outputs (dict) of a finished node."""
+        payload = pickle.dumps(outputs, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO nodes (node, payload, completed_at) VALUES (?, ?, ?)",
+                (node, payload, time.time())
+            )
+            conn.commit()
+
+    def load_node(self, node):
+        """Outputs of a finished node, or None if it has not completed."""
+        with self.lock:
+            row = self._connect().execute("SELECT payload FROM nodes WHERE node = ?", (node,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def save_items(self, stage, results):
+        """
+        Store per-conversation results of a stage ("summary", "tags", ...) in one transaction.
+
+        Args:
+            stage (str): Stage name
+            results (dict): {conversation_id: value}
+        """
+        now = time.time()
+        rows = [
+            (stage, str(conv_id), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now)
+            for conv_id, value in results.items()
+        ]
+        with self.lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO items (stage, conversation_id, value, completed_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+
+    def save_item(self, stage, conversation_id, value):
+        """Store the result of a single conversation."""
+        self.save_items(stage, {conversation_id: value})
+
+    def load_items(self, stage):
+        """
+        Results already stored for a stage.
+
+        Returns:
+            dict: {str(conversation_id): value}
+        """
+        with self.lock:
+            rows = self._connect().execute(
+                "SELECT conversation_id, value FROM items WHERE stage = ?", (stage,)
+            ).fetchall()
+        return {conv_id: pickle.loads(value) for conv_id, value in rows}
+
+    def clear(self):
+        """Forget every checkpoint (start of a fresh run)."""
+        with self.lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM nodes")
+            conn.execute("DELETE FROM items")
+            conn.commit()
+
+
+# Global checkpoint store used by the workflow nodes
+workflow_checkpoint = WorkflowCheckpoint()
@@ -0,0 +1,202 @@
+"""
+Embedding service shared by the Chroma loader, tag retrieval and duplicate detection.
+
+The sentence-transformers model is loaded on first use, once per process.
+Vectors are cached on disk, keyed by a SHA-1 hash of the text: the float32
+rows live in a file read through a NumPy memmap, and a small SQLite index maps
+each hash to its row. New rows are numbered and written under the database's
+write lock, so several processes (e.g. datastore.py and a search session) can
+share the cache. `embed(texts)` looks every text up,
+runs the model only on the ones never seen before (in batches) and appends
+them, so the same summary or document embedded by two stages, or by two runs,
+is only encoded once.
+"""
+import hashlib
+import os
+import re
+import threading
+import numpy as np
+
+from sqlite_store import SQLiteStore, hit_stats
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_CACHE_DIR = 'data/embedding_cache'
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_embedding_model(model_name=EMBEDDING_MODEL):
+    """Load a SentenceTransformer once per process."""
+    with _models_lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+            _models[model_name] = SentenceTransformer(model_name)
+        return _models[model_name]
+
+
+def text_hash(text):
+    """Cache key of a text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingService(SQLiteStore):
+    """
+    Batched, cached embeddings for one model.
+
+    Rows are L2-normalized float32 vectors, so a dot product is the cosine similarity.
+    `self.lock` covers the vector file as well as the index; the index connection is in
+    autocommit mode so `_append` can take the database write lock itself, and it waits
+    up to a minute for another process's append instead of failing.
+
+    Args:
+        model_name (str): sentence-transformers model
+        cache_dir (str): Directory for `<model>.f32` (vectors) and `<model>.sqlite` (index);
+            None keeps nothing on disk
+        batch_size (int): Batch size for model.encode
+    """
+
+    isolation_level = None
+    timeout = 60
+
+    def __init__(self, model_name=EMBEDDING_MODEL, cache_dir=EMBEDDING_CACHE_DIR, batch_size=EMBEDDING_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        base = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name)) if cache_dir else None
+        super().__init__(base + ".sqlite" if base else None)
+        self.vectors_path = base + ".f32" if base else None
+        self.hits = 0
+        self.misses = 0
+        self._dim = None
+        self._vectors = None  # memmap over the vector file, reopened when it grows
+
+    def _create_schema(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS vectors (hash TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _load_dim(self):
+        dim = self._connect().execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self._dim = int(dim[0]) if dim else None
+        return self._dim
+
+    def _cached_rows(self, hashes):
+        """{hash: row} for the hashes already in the index."""
+        conn = self._connect()
+        rows = {}
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), 500):  # stay under SQLite's bound-parameter limit
+            chunk = unique[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.update(conn.execute(f"SELECT hash, row FROM vectors WHERE hash IN ({placeholders})", chunk))
+        return rows
+
+    def _read(self, rows):
+        if self._dim is None:
+            self._load_dim()
+        needed = max(rows) + 1 if rows else 0
+        if self._vectors is None or len(self._vectors) < needed:
+            n_rows = os.path.getsize(self.vectors_path) // (self._dim * 4)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self._dim))
+        return np.asarray(self._vectors[rows])
+
+    def _append(self, hashes, vectors):
+        """
+        Writes new vectors after the last indexed row and indexes them. Returns {hash: row}.
+
+        Row numbers come from the index (MAX(row) + 1) inside a BEGIN IMMEDIATE transaction,
+        so processes sharing the cache never hand out the same row, and hashes another process
+        stored in the meantime keep its row. Bytes past the last indexed row (left by an
+        interrupted writer) are overwritten, never truncated.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._cached_rows(hashes)
+            missing = [i for i, h in enumerate(hashes) if h not in rows]
+            if missing:
+                if self._load_dim() is None:
+                    self._dim = vectors.shape[1]
+                    conn.execute("INSERT INTO meta (key, value) VALUES ('dim', ?)", (str(self._dim),))
+                first_row = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()[0]
+                with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                    f.seek(first_row * self._dim * 4)
+                    f.write(np.ascontiguousarray(vectors[missing], dtype=np.float32).tobytes())
+                added = {hashes[i]: first_row + j for j, i in enumerate(missing)}
+                conn.executemany("INSERT INTO vectors (hash, row) VALUES (?, ?)", added.items())
+                rows.update(added)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _encode(self, texts):
+        vectors = get_embedding_model(self.model_name).encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True,
+            convert_to_numpy=True, show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed(self, texts):
+        """
+        Embed a list of texts.
+
+        Returns:
+            np.ndarray: float32 matrix, one L2-normalized row per text (in order)
+        """
+        texts = [str(text) for text in texts]
+        if not texts:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+        if self.path is None:
+            return self._encode(texts)
+
+        hashes = [text_hash(text) for text in texts]
+        with self.lock:
+            cached = self._cached_rows(hashes)
+            new = {h: text for h, text in zip(hashes, texts) if h not in cached}
+            self.hits += sum(h in cached for h in hashes)
+            self.misses += len(new)
+            if new:
+                cached.update(self._append(list(new), self._encode(list(new.values()))))
+            return self._read([cached[h] for h in hashes])
+
+    def clear(self):
+        """Deletes every cached vector."""
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM vectors")
+            conn.execute("DELETE FROM meta")
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
+            conn.execute("COMMIT")
+            self._dim, self._vectors = None, None
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached vectors."""
+        with self.lock:
+            vectors = self._connect().execute("SELECT COUNT(*) FROM vectors").fetchone()[0] if self.path else 0
+            return {**hit_stats(self.hits, self.misses), "vectors": vectors}
+
+    def report(self):
+        """Prints the cache counters."""
+        stats = self.stats()
+        print(f"🧮 Embedding cache: {stats['hits']} hits, {stats['misses']} encoded "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['vectors']} vectors stored")
+
+
+_services = {}
+
+
+def get_embedding_service(model_name=EMBEDDING_MODEL):
+    """One EmbeddingService per model, shared by every caller in the process."""
+    with _models_lock:
+        if model_name not in _services:
+            _services[model_name] = EmbeddingService(model_name)
+        return _services[model_name]
+
+
+def embed(texts, model_name=EMBEDDING_MODEL):
+    """Cached embeddings of `texts` (float32, L2-normalized rows) with the shared service."""
+    return get_embedding_service(model_name).embed(texts)
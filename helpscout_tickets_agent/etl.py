@@ -1,6 +1,6 @@
 # %% #Import libraries
-from help_functions import threads_prep, group_threads, extract_tags, get_conversations_by_inbox, get_threads_by_inbox
-from bs4 import BeautifulSoup
+from help_functions import threads_prep, group_threads, extract_tags, get_conversations_and_threads_by_inbox
+from text_processing import html_process_pool, strip_html_many
 import pandas as pd
 #%% #API call
 #conversations = get_conversations_by_assigned_id('831957')
@@ -9,8 +9,8 @@ import pandas as pd
 # conversations = get_conversations_by_tag('ts-escalation')
 # threads = get_threads_by_tag('ts-escalation')
 
-conversations = get_conversations_by_inbox('294254')
-threads = get_threads_by_inbox('294254')
+# Single pass over the mailbox: conversations and threads come from the same listing
+conversations, threads = get_conversations_and_threads_by_inbox('294254', embed_threads=True)
 #%% 
 df_conversations = pd.DataFrame(conversations)
 
@@ -28,17 +28,20 @@ df_conversations['tags_list'] = df_conversations['tags'].apply(
 df_conversations.to_csv("data/conversations.csv", index=False)
 
 #%%
-cleaned_threads = []
-for thread in threads:
-    # Make a copy to avoid modifying the original data
-    cleaned_thread = thread.copy()
-    
-    # Check if 'body' exists and is not None
-    if 'body' in cleaned_thread and cleaned_thread['body']:
-        soup = BeautifulSoup(cleaned_thread['body'], 'html.parser')
-        cleaned_thread['body'] = soup.get_text(separator=' ', strip=True)
-    
-    cleaned_threads.append(cleaned_thread)
+# Raw HTML bodies for the HTML-to-text benchmark (benchmarks.py); off by default
+SAVE_RAW_THREADS = False
+if SAVE_RAW_THREADS and threads:
+    pd.DataFrame(threads)[['conversation_id', 'id', 'type', 'body']].to_csv("data/raw_threads.csv", index=False)
+
+# HTML to text for every thread body (on copies, to keep the original data);
+# raise HTML_N_PROCESS to spread the work over several cores
+HTML_N_PROCESS = 1
+cleaned_threads = [thread.copy() for thread in threads]
+with_body = [thread for thread in cleaned_threads if thread.get('body')]
+with html_process_pool(HTML_N_PROCESS) as executor:
+    texts = strip_html_many([thread['body'] for thread in with_body], executor=executor)
+for thread, text in zip(with_body, texts):
+    thread['body'] = text
 df_cleaned_threads = pd.DataFrame(cleaned_threads)
 df_cleaned_threads.to_csv("data/cleaned_threads.csv", index=False)
 
@@ -49,91 +52,26 @@ df_filtered_threads = pd.DataFrame(filtered_threads)
 df_filtered_threads.to_csv("data/filtered_threads.csv", index=False)
 
 #%% 
-import re
 import pandas as pd
-import spacy
-from tqdm.auto import tqdm
-
-# Carrega modelo spaCy
-nlp = spacy.load("en_core_web_sm")  # Altere se estiver usando outro modelo
-
-# ========================
-# Funções de pré-processamento
-# ========================
-
-def clean_body(text: str) -> str:
-    """
-    Remove URLs, e-mails, telefones, quebras de linha e espaços extras.
-    """
-    text = str(text)
-    text = re.sub(r"https?://\S+", "", text)
-    text = re.sub(r"[\w\.-]+@[\w\.-]+", "", text)
-    text = re.sub(r"\(?\d{2,3}\)?[\s-]?\d{3,5}[\s-]?\d{4}", "", text)
-    text = re.sub(r"\s{2,}", " ", text)
-    text = text.replace("\n", " ").replace("\r", "")
-    return text.strip()
-
-
-def remove_signature(text: str) -> str:
-    """
-    Remove assinaturas de e-mail usando padrões e palavras de despedida.
-    """
-    text = str(text)
-
-    farewell_words = (
-        r"best|regards|kind regards|warm regards|sincerely|thanks|thank you|cheers|respectfully|"
-        r"yours truly|yours sincerely|yours faithfully|take care|atenciosamente|obrigado|agradeço|abs"
-    )
-    common_titles = (
-        r"manager|analyst|engineer|developer|designer|director|ceo|cto|founder|consultant|"
-        r"coordinator|president|gerente|assistant|controller|accountant"
-    )
-
-    # Regex: linha de despedida seguida por cargo e até duas linhas adicionais
-    pattern = (
-        rf"(?i)(?:^|\n)[ \t]*({farewell_words})[^\n]*\n"
-        rf"(?:.*({common_titles}).*\n*){{0,3}}"
-    )
-
-    text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
-    return text.strip()
-
-
-def spacy_normalize(text: str) -> str:
-    """
-    Lematiza e remove pontuação e stopwords usando spaCy.
-    """
-    doc = nlp(text)
-    tokens = [token.lemma_ for token in doc if not token.is_punct and not token.is_stop]
-    return " ".join(tokens)
+from text_processing import clean_message, normalize_texts
 
+# Normalização com spaCy em lote (nlp.pipe): textos por lote e processos
+SPACY_BATCH_SIZE = 256
+SPACY_N_PROCESS = 1
 
 # ========================
 # Pipeline para DataFrame com mensagens
 # ========================
 
-def process_message_row(row):
-    """
-    Aplica limpeza e normalização para um registro com campo 'body'.
-    Retorna apenas a versão normalizada.
-    """
-    try:
-        body = str(row['body'])
-        no_sig = remove_signature(body)
-        clean = clean_body(no_sig)
-        norm = spacy_normalize(clean)
-        return norm
-    except Exception:
-        return ""
-
-
 def process_df_messages(df: pd.DataFrame) -> pd.DataFrame:
     """
     Aplica o pipeline a todo o DataFrame.
+    A limpeza (assinaturas, URLs, e-mails, telefones) usa regexes pré-compiladas
+    e a normalização roda em lotes com nlp.pipe.
     Retorna DataFrame com nova coluna 'normalized'.
     """
-    tqdm.pandas(desc="Normalizando mensagens")
-    df['normalized'] = df.progress_apply(process_message_row, axis=1)
+    cleaned = df['body'].astype(str).map(clean_message)
+    df['normalized'] = normalize_texts(cleaned, batch_size=SPACY_BATCH_SIZE, n_process=SPACY_N_PROCESS)
     return df
 
 #%%
@@ -1,9 +1,12 @@
 import os
+import time
+import threading
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import pandas as pd
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,7 +18,13 @@ app_secret = os.getenv('HP_APP_SECRET')
 # SESSION WITH RETRY
 # =============================================================================
 
-def create_session_with_retries():
+# Maximum number of thread requests kept in flight by the concurrent fetchers
+MAX_CONCURRENT_REQUESTS = 8
+
+# Default search window for the mailbox fetchers (used when no query is given)
+DEFAULT_INBOX_QUERY = 'createdAt:[2025-01-01T00:00:00Z TO 2025-02-01T00:00:00Z]'
+
+def create_session_with_retries(pool_maxsize=MAX_CONCURRENT_REQUESTS + 2):
     """Creates a requests.Session with retry logic for handling transient errors."""
     session = requests.Session()
     retry = Retry(
@@ -25,7 +34,9 @@ def create_session_with_retries():
         backoff_factor=0.3,
         status_forcelist=(500, 502, 503, 504),
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    # Pool sized for the concurrent workers plus the page prefetch, so
+    # parallel requests reuse connections instead of discarding them
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
@@ -33,121 +44,345 @@ def create_session_with_retries():
 # Global session object to reuse connections and retry logic
 session = create_session_with_retries()
 
+# =============================================================================
+# RATE LIMITING
+# =============================================================================
+
+class RateLimiter:
+    """
+    Token bucket that paces every Help Scout API request.
+
+    Tokens refill at `rate_per_minute`; `burst` caps how many requests can go
+    out back to back. The rate adapts to the `X-RateLimit-*` headers returned
+    by the API, and a 429 pauses the whole bucket for the `Retry-After` period.
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, rate_per_minute=400, burst=10):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.throttled_count = 0
+        self.started_at = None
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    self.request_count += 1
+                    if self.started_at is None:
+                        self.started_at = now
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """Adjusts the pacing using the rate-limit headers of a response."""
+        limit = headers.get('X-RateLimit-Limit-Minute')
+        remaining = headers.get('X-RateLimit-Remaining-Minute', headers.get('X-RateLimit-Remaining'))
+        with self.lock:
+            if limit and limit.isdigit() and int(limit) > 0:
+                self.rate = int(limit) / 60.0
+            if remaining is not None and remaining.isdigit():
+                # Never hold more tokens than the API says are left in the window
+                self.tokens = min(self.tokens, float(remaining))
+
+    def throttle(self, retry_after):
+        """Pauses all requests for `retry_after` seconds after a 429 response."""
+        with self.lock:
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self.throttled_count += 1
+
+    def snapshot(self):
+        """Current counters, to measure one fetcher with `stats(since=...)`."""
+        with self.lock:
+            return {"requests": self.request_count, "throttled": self.throttled_count, "at": time.monotonic()}
+
+    def stats(self, since=None):
+        """
+        Returns the number of requests sent, throttled responses and achieved requests/sec,
+        since the first request of the process or since a `snapshot()`.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if since is None:
+                requests = self.request_count
+                throttled = self.throttled_count
+                elapsed = now - self.started_at if self.started_at else 0.0
+            else:
+                requests = self.request_count - since["requests"]
+                throttled = self.throttled_count - since["throttled"]
+                elapsed = now - since["at"]
+            return {
+                "requests": requests,
+                "throttled": throttled,
+                "elapsed_seconds": round(elapsed, 2),
+                "requests_per_second": round(requests / elapsed, 2) if elapsed else 0.0,
+            }
+
+    def report(self, since=None):
+        """Prints the achieved request rate (since a `snapshot()` when given)."""
+        stats = self.stats(since)
+        print(f"📈 API rate: {stats['requests']} requests in {stats['elapsed_seconds']}s "
+              f"({stats['requests_per_second']} req/s, {stats['throttled']} throttled)")
+
+# Global rate limiter shared by every fetcher
+rate_limiter = RateLimiter()
+
+def _retry_after_seconds(headers, default=10):
+    """Reads the wait time from the Retry-After style headers of a 429 response."""
+    for name in ('Retry-After', 'X-RateLimit-Retry-After'):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(float(value), 1.0)
+            except ValueError:
+                pass
+    return default
+
+def api_get(url, params=None, timeout=30, max_throttle_retries=10):
+    """
+    Sends an authenticated GET request through the rate limiter.
+
+    The bearer token comes from the shared token provider. Throttled (429)
+    calls are requeued after the `Retry-After` delay instead of being dropped,
+    and a 401 renews the token once and retries; other HTTP errors are raised
+    as usual.
+    """
+    token_renewed = False
+    attempt = 0
+    while True:
+        token = token_provider.get_token()
+        headers = {"Authorization": f"Bearer {token}"}
+        rate_limiter.acquire()
+        response = session.get(url, headers=headers, params=params, timeout=timeout)
+        rate_limiter.update_from_headers(response.headers)
+        if response.status_code == 401 and not token_renewed:
+            # Token expired mid-run: drop it and retry with a fresh one
+            print("🔑 Access token rejected, renewing...", flush=True)
+            token_provider.invalidate(token)
+            token_renewed = True
+            continue
+        if response.status_code != 429 or attempt == max_throttle_retries:
+            break
+        retry_after = _retry_after_seconds(response.headers)
+        print(f"⏳ Rate limited, requeueing request in {retry_after:.0f}s...", flush=True)
+        rate_limiter.throttle(retry_after)
+        attempt += 1
+    response.raise_for_status()
+    return response
+
 # =============================================================================
 # AUTHENTICATION
 # =============================================================================
 
+class TokenProvider:
+    """
+    Caches the Help Scout OAuth access token until it expires.
+
+    The token is renewed `refresh_margin` seconds before its `expires_in`
+    deadline, or on demand after `invalidate` (e.g. following a 401). A lock
+    makes sure concurrent workers share one token instead of each minting
+    their own.
+    """
+
+    def __init__(self, refresh_margin=60):
+        self.refresh_margin = refresh_margin
+        self.token = None
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+
+    def _request_token(self):
+        token_url = "https://api.helpscout.net/v2/oauth2/token"
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": api_id,
+            "client_secret": app_secret
+        }
+        try:
+            response = session.post(token_url, data=data)
+            response.raise_for_status()  # Raise an exception for bad status codes
+            payload = response.json()
+            self.token = payload["access_token"]
+            self.expires_at = time.monotonic() + float(payload.get("expires_in", 7200))
+        except requests.exceptions.RequestException as e:
+            print(f"Error getting token: {e}")
+            self.token = None
+            self.expires_at = 0.0
+
+    def get_token(self):
+        """Returns a valid access token, requesting a new one only when needed."""
+        with self.lock:
+            if not self.token or time.monotonic() >= self.expires_at - self.refresh_margin:
+                self._request_token()
+            return self.token
+
+    def invalidate(self, token=None):
+        """Discards the cached token (only if it is still `token`, when given)."""
+        with self.lock:
+            if token is None or token == self.token:
+                self.token = None
+                self.expires_at = 0.0
+
+# Global token provider shared by every fetcher
+token_provider = TokenProvider()
+
 def get_oauth_token():
-    """Gets OAuth access token using app credentials."""
-    token_url = "https://api.helpscout.net/v2/oauth2/token"
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": api_id,
-        "client_secret": app_secret
-    }
+    """Gets OAuth access token using app credentials (cached until it expires)."""
+    return token_provider.get_token()
+
+# =============================================================================
+# CONCURRENT FETCHING
+# =============================================================================
+
+def _fetch_conversation_threads(conv, base_url="https://api.helpscout.net/v2", timeout=30):
+    """
+    Fetches the threads of a single conversation, tagging each thread with its
+    conversation id and number. Returns None if the request fails.
+    """
+    conv_id = conv.get('id')
+    conv_number = conv.get('number')
+    threads_url = f"{base_url}/conversations/{conv_id}/threads"
     try:
-        response = session.post(token_url, data=data)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        return response.json()["access_token"]
+        thread_resp = api_get(threads_url, timeout=timeout)
+        threads_data = thread_resp.json().get('_embedded', {}).get('threads', [])
+        for thread in threads_data:
+            thread['conversation_id'] = conv_id
+            thread['conversation_number'] = conv_number
+        return threads_data
+    except requests.exceptions.Timeout:
+        print(f"    ⚠️  Timeout on conv #{conv_number} (ID: {conv_id}), skipping")
     except requests.exceptions.RequestException as e:
-        print(f"Error getting token: {e}")
-        return None
+        print(f"    ❌ Error on conv #{conv_number} (ID: {conv_id}): {e}")
+    return None
+
+def _fetch_threads_concurrently(conversations, executor):
+    """
+    Fetches the threads of every conversation using the given executor.
+    Returns one list of threads per conversation, in the same order as `conversations`
+    (None for the conversations whose request failed).
+    """
+    return list(executor.map(_fetch_conversation_threads, conversations))
+
+def _fetch_conversations_page(url, params, page, timeout=30):
+    """Fetches one page of the conversations listing and returns the decoded JSON."""
+    page_params = {**params, 'page': page}
+    response = api_get(url, params=page_params, timeout=timeout)
+    return response.json()
+
+def _iter_conversation_pages(url, params, page_executor, label, max_pages=None, listing=None):
+    """
+    Yields `(page, conversations)` for each page of a conversations listing.
+
+    The next page is requested on `page_executor` as soon as the current one
+    arrives, so it downloads while the caller processes the current page.
+    When given, `listing["complete"]` is set to True once the last page was
+    yielded (it stays False if a page failed or `max_pages` cut the listing).
+    """
+    if listing is not None:
+        listing["complete"] = False
+    page = 1
+    future = page_executor.submit(_fetch_conversations_page, url, params, page)
+    while True:
+        print(f"\nFetching conversations page {page} for {label}...", flush=True)
+        try:
+            data = future.result()
+        except requests.exceptions.Timeout:
+            print(f"⚠️  Timeout on page {page}, retrying...")
+            future = page_executor.submit(_fetch_conversations_page, url, params, page)
+            continue
+        except requests.exceptions.RequestException as e:
+            print(f"\n❌ Failed to fetch conversations page {page}: {e}")
+            return
+
+        has_next = '_links' in data and 'next' in data['_links']
+        if has_next and (max_pages is None or page < max_pages):
+            future = page_executor.submit(_fetch_conversations_page, url, params, page + 1)
+        elif not has_next:
+            print("\n✓ Reached last page")
+
+        yield page, data.get('_embedded', {}).get('conversations', [])
+
+        if not has_next:
+            if listing is not None:
+                listing["complete"] = True
+            return
+        if max_pages is not None and page >= max_pages:
+            print(f"\n⚠️  Stopped after {max_pages} pages")
+            return
+        page += 1
 
 # =============================================================================
 # DATA RETRIEVAL
 # =============================================================================
 
-def get_conversations_by_tag(tag_name):
-    """Gets conversations with a specific tag using OAuth."""
+def iter_conversations_by_tag(tag_name, listing=None):
+    """
+    Yields, page by page, the conversations with a specific tag (the next page downloads meanwhile).
+    When given, `listing["complete"]` tells whether the last page was reached.
+    """
+    started = rate_limiter.snapshot()
     token = get_oauth_token()
     if not token:
-        return None
+        print("Failed to get OAuth token.")
+        return
 
     url = "https://api.helpscout.net/v2/conversations"
     params = {
         "query": f'tag:"{tag_name}" AND createdAt:[2025-10-01T00:00:00Z TO 2025-10-05T00:00:00Z]',
         "status": "closed",
         "pageSize": 50,
-        "page": 1
-    }
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
     }
-    
-    all_conversations = []
-    while True:
-        try:
-            response = session.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            conversations = data.get('_embedded', {}).get('conversations', [])
-            all_conversations.extend(conversations)
-            if '_links' in data and 'next' in data['_links']:
-                params['page'] += 1
-            else:
-                break
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch conversations for tag '{tag_name}': {e}")
-            break
-    
-    print(f"Retrieved {len(all_conversations)} total conversations for tag '{tag_name}'")
-    return all_conversations
+    with ThreadPoolExecutor(max_workers=1) as page_executor:
+        pages = _iter_conversation_pages(url, params, page_executor, label=f"tag '{tag_name}'", listing=listing)
+        for _, conversations in pages:
+            yield conversations
+    rate_limiter.report(since=started)
+
 def get_conversations_by_tag(tag_name):
     """Gets conversations with a specific tag using OAuth."""
     token = get_oauth_token()
     if not token:
         return None
 
-    url = "https://api.helpscout.net/v2/conversations"
-    params = {
-        "query": f'tag:"{tag_name}" AND createdAt:[2025-10-01T00:00:00Z TO 2025-10-05T00:00:00Z]',
-        "status": "closed",
-        "pageSize": 50,
-        "page": 1
-    }
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
-    all_conversations = []
-    while True:
-        try:
-            response = session.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            conversations = data.get('_embedded', {}).get('conversations', [])
-            all_conversations.extend(conversations)
-            if '_links' in data and 'next' in data['_links']:
-                params['page'] += 1
-            else:
-                break
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch conversations for tag '{tag_name}': {e}")
-            break
-    
+    all_conversations = [conv for conversations in iter_conversations_by_tag(tag_name) for conv in conversations]
     print(f"Retrieved {len(all_conversations)} total conversations for tag '{tag_name}'")
     return all_conversations
 
-def get_conversations_by_inbox(mailboxId):
-    """Gets conversations with a specific tag using OAuth."""
+def get_conversations_by_inbox(mailboxId, query=None, status="closed"):
+    """
+    Gets conversations from a specific mailbox using OAuth.
+    `query` defaults to DEFAULT_INBOX_QUERY; pass e.g. 'modifiedAt:[... TO *]' for incremental syncs.
+    """
+    started = rate_limiter.snapshot()
     token = get_oauth_token()
     if not token:
         return None
 
     url = "https://api.helpscout.net/v2/conversations"
     params = {
-        "query": 'createdAt:[2025-01-01T00:00:00Z TO 2025-02-01T00:00:00Z]',
+        "query": query or DEFAULT_INBOX_QUERY,
         "mailbox": mailboxId,
-        "status": "closed",
+        "status": status,
         "pageSize": 50,
         "page": 1
     }
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
     
     all_conversations = []
     page = 1
@@ -158,8 +393,7 @@ def get_conversations_by_inbox(mailboxId):
         params['page'] = page
         print(f"Fetching conversations page {page} for mailbox ID {mailboxId}...", end=' ', flush=True)
         try:
-            response = session.get(url, headers=headers, params=params, timeout=30)
-            response.raise_for_status()
+            response = api_get(url, params=params, timeout=30)
             data = response.json()
             conversations = data.get('_embedded', {}).get('conversations', [])
             all_conversations.extend(conversations)
@@ -178,255 +412,230 @@ def get_conversations_by_inbox(mailboxId):
             break
     
     print(f"Retrieved {len(all_conversations)} total conversations for mailbox ID '{mailboxId}'")
+    rate_limiter.report(since=started)
     return all_conversations
 
-def get_threads_by_tag(tag_name):
-    """Gets all threads from conversations with a specific tag name."""
+def _embedded_threads(conv):
+    """
+    Returns the threads embedded in a conversation listing (embed=threads), tagged with the conversation.
+    The threads are removed from the conversation so the raw bodies are not kept alive by it.
+    """
+    threads_data = conv.get('_embedded', {}).pop('threads', [])
+    for thread in threads_data:
+        thread['conversation_id'] = conv.get('id')
+        thread['conversation_number'] = conv.get('number')
+    return threads_data
+
+def _iter_conversations_with_threads(params, label, max_workers=MAX_CONCURRENT_REQUESTS,
+                                     conversation_filter=None, embed_threads=False, max_pages=None,
+                                     listing=None):
+    """
+    Pages through a conversations listing once and yields `(conversations, threads)` per page.
+
+    Threads are fetched concurrently (up to `max_workers` requests in flight)
+    while the next page is prefetched, or taken from the listing itself when
+    `embed_threads=True`. Only conversations accepted by `conversation_filter`
+    (all of them when None) get their threads returned.
+
+    When given, the `listing` dict is filled with "complete" (the last page was
+    reached) and "failed_conversations" (ids whose threads could not be fetched).
+    """
+    if listing is not None:
+        listing.update(complete=False, failed_conversations=[])
+    started = rate_limiter.snapshot()
     token = get_oauth_token()
     if not token:
-        return []
-
-    base_url = "https://api.helpscout.net/v2"
-    headers = {"Authorization": f"Bearer {token}"}
-    conversations_url = f"{base_url}/conversations"
+        print("Failed to get OAuth token.")
+        return
+
+    conversations_url = "https://api.helpscout.net/v2/conversations"
+    params = dict(params)
+    if embed_threads:
+        params["embed"] = "threads"
+
+    with ThreadPoolExecutor(max_workers=1) as page_executor, \
+            ThreadPoolExecutor(max_workers=max_workers) as thread_executor:
+        pages = _iter_conversation_pages(
+            conversations_url, params, page_executor, label=label, max_pages=max_pages, listing=listing
+        )
+        for page, conversations in pages:
+            print(f"  ✓ Got {len(conversations)} conversations", end='', flush=True)
+            # Embedded threads are taken off every conversation, so the rejected ones
+            # do not keep their raw bodies alive either
+            page_threads = [_embedded_threads(conv) for conv in conversations] if embed_threads else None
+            selected = conversations
+            if conversation_filter is not None:
+                keep = [conversation_filter(conv) for conv in conversations]
+                selected = [conv for conv, kept in zip(conversations, keep) if kept]
+                if embed_threads:
+                    page_threads = [threads_data for threads_data, kept in zip(page_threads, keep) if kept]
+                print(f" ({len(selected)} selected)", end='')
+            if embed_threads:
+                print(", threads embedded", flush=True)
+            else:
+                print(", fetching threads...", flush=True)
+                page_threads = _fetch_threads_concurrently(selected, thread_executor)
+                if listing is not None:
+                    listing["failed_conversations"].extend(
+                        conv.get('id') for conv, threads_data in zip(selected, page_threads) if threads_data is None
+                    )
+            threads = [thread for threads_data in page_threads for thread in threads_data or []]
+            print(f"  ✓ {len(threads)} threads from page {page}", flush=True)
+            yield conversations, threads
+
+    rate_limiter.report(since=started)
+
+def iter_threads_by_tag(tag_name, max_workers=MAX_CONCURRENT_REQUESTS, listing=None):
+    """
+    Yields, page by page, the threads of conversations with a specific tag name.
+    `listing` reports whether every page and thread was fetched (see _iter_conversations_with_threads).
+    """
     params = {
        "query": f'tag:"{tag_name}" AND createdAt:[2025-10-01T00:00:00Z TO 2025-10-05T00:00:00Z]',
         "status": "all",
         "pageSize": 50,
-        "page": 1
     }
-    
-    all_threads = []
-    page = 1
-    while True:
-        params['page'] = page
-        try:
-            response = session.get(conversations_url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            conversations = data.get('_embedded', {}).get('conversations', [])
-            
-            for conv in conversations:
-                conv_id = conv.get('id')
-                conv_number = conv.get('number')
-                threads_url = f"{base_url}/conversations/{conv_id}/threads"
-                try:
-                    thread_resp = session.get(threads_url, headers=headers)
-                    thread_resp.raise_for_status()
-                    threads_data = thread_resp.json().get('_embedded', {}).get('threads', [])
-                    for thread in threads_data:
-                        thread['conversation_id'] = conv_id
-                        thread['conversation_number'] = conv_number
-                    all_threads.extend(threads_data)
-                except requests.exceptions.RequestException as e:
-                    print(f"Failed to fetch threads for conversation {conv_id}: {e}")
+    pages = _iter_conversations_with_threads(params, f"tag '{tag_name}'", max_workers=max_workers, listing=listing)
+    for _, threads in pages:
+        yield threads
 
-            if '_links' in data and 'next' in data['_links']:
-                page += 1
-            else:
-                break
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch conversations page {page} for tag '{tag_name}': {e}")
-            break
-    
+def get_threads_by_tag(tag_name):
+    """Gets all threads from conversations with a specific tag name."""
+    all_threads = [thread for threads in iter_threads_by_tag(tag_name) for thread in threads]
     print(f"Retrieved {len(all_threads)} total threads for tag '{tag_name}'")
     return all_threads
 
-def get_threads_by_assigned_to_first_name(first_name):
+def iter_threads_by_assigned_to_first_name(first_name, max_workers=MAX_CONCURRENT_REQUESTS):
     """
-    Gets all threads from conversations assigned to a user with the given first name.
+    Yields, page by page, the threads of conversations assigned to a user with the given first name.
     Since HelpScout API does not filter by first name directly, 
     we fetch conversations with assignments, then filter by assignee first name locally.
     """
-    token = get_oauth_token()
-    if not token:
-        print("Failed to get OAuth token.")
-        return []
-
-    base_url = "https://api.helpscout.net/v2"
-    headers = {"Authorization": f"Bearer {token}"}
-    conversations_url = f"{base_url}/conversations"
-    
     params = {
         "query": 'assigned_to:[*] TO [*]',
         "status": "all",
         "pageSize": 50,
-        "page": 1
     }
-    
-    all_threads = []
-    page = 1
-    while True:
-        params['page'] = page
-        print(f"Fetching conversations page {page}...")
-        try:
-            response = session.get(conversations_url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            conversations = data.get('_embedded', {}).get('conversations', [])
-            print(f"Page {page}: fetched {len(conversations)} conversations")
-
-            filtered_conversations = [
-                conv for conv in conversations 
-                if conv.get('assignee') and conv['assignee'].get('firstName', '').lower() == first_name.lower()
-            ]
-            print(f"Page {page}: found {len(filtered_conversations)} conversations assigned to '{first_name}'")
-
-            for conv in filtered_conversations:
-                conv_id = conv.get('id')
-                conv_number = conv.get('number')
-                threads_url = f"{base_url}/conversations/{conv_id}/threads"
-                try:
-                    thread_resp = session.get(threads_url, headers=headers)
-                    thread_resp.raise_for_status()
-                    threads_data = thread_resp.json().get('_embedded', {}).get('threads', [])
-                    for thread in threads_data:
-                        thread['conversation_id'] = conv_id
-                        thread['conversation_number'] = conv_number
-                    all_threads.extend(threads_data)
-                except requests.exceptions.RequestException as e:
-                    print(f"Failed to fetch threads for conversation {conv_id}: {e}")
+    def assigned_to_first_name(conv):
+        return bool(conv.get('assignee')) and conv['assignee'].get('firstName', '').lower() == first_name.lower()
 
-            if '_links' in data and 'next' in data['_links']:
-                page += 1
-            else:
-                break
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch conversations page {page}: {e}")
-            break
-
-    print(f"Retrieved {len(all_threads)} total threads for conversations assigned to '{first_name}'")
-    return all_threads
+    pages = _iter_conversations_with_threads(
+        params, f"assignee '{first_name}'", max_workers=max_workers,
+        conversation_filter=assigned_to_first_name
+    )
+    for _, threads in pages:
+        yield threads
 
-def get_threads_by_assigned_id(assigned_user_id):
+def get_threads_by_assigned_to_first_name(first_name):
     """
-    Gets all threads from conversations assigned to a specific user ID.
+    Gets all threads from conversations assigned to a user with the given first name.
+    Since HelpScout API does not filter by first name directly, 
+    we fetch conversations with assignments, then filter by assignee first name locally.
     """
-    token = get_oauth_token()
-    if not token:
-        print("Failed to get OAuth token.")
-        return []
+    all_threads = [
+        thread for threads in iter_threads_by_assigned_to_first_name(first_name) for thread in threads
+    ]
+    print(f"Retrieved {len(all_threads)} total threads for conversations assigned to '{first_name}'")
+    return all_threads
 
-    base_url = "https://api.helpscout.net/v2"
-    headers = {"Authorization": f"Bearer {token}"}
-    conversations_url = f"{base_url}/conversations"
-    
+def iter_threads_by_assigned_id(assigned_user_id, max_workers=MAX_CONCURRENT_REQUESTS):
+    """Yields, page by page, the threads of conversations assigned to a specific user ID."""
     params = {
         "query": 'createdAt:[2025-01-01T00:00:00Z TO *]',
         "assigned_to": assigned_user_id,
         "status": "all",
         "pageSize": 50,
-        "page": 1
     }
-    
-    all_threads = []
-    page = 1
-    while True:
-        params['page'] = page
-        print(f"Fetching conversations page {page} for user ID {assigned_user_id}...")
-        try:
-            response = session.get(conversations_url, headers=headers, params=params)
-            response.raise_for_status()
-
-            data = response.json()
-            conversations = data.get('_embedded', {}).get('conversations', [])
-            print(f"Page {page}: fetched {len(conversations)} conversations")
-
-            for conv in conversations:
-                conv_id = conv.get('id')
-                conv_number = conv.get('number')
-
-                threads_url = f"{base_url}/conversations/{conv_id}/threads"
-                try:
-                    thread_resp = session.get(threads_url, headers=headers)
-                    thread_resp.raise_for_status()
-                    threads_data = thread_resp.json().get('_embedded', {}).get('threads', [])
-                    for thread in threads_data:
-                        thread['conversation_id'] = conv_id
-                        thread['conversation_number'] = conv_number
-                    all_threads.extend(threads_data)
-                except requests.exceptions.RequestException as e:
-                    print(f"Failed to fetch threads for conversation {conv_id}: {e}")
-
-            if '_links' in data and 'next' in data['_links']:
-                page += 1
-            else:
-                break
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch conversations page {page}: {e}")
-            break
+    pages = _iter_conversations_with_threads(params, f"user ID {assigned_user_id}", max_workers=max_workers)
+    for _, threads in pages:
+        yield threads
 
+def get_threads_by_assigned_id(assigned_user_id):
+    """
+    Gets all threads from conversations assigned to a specific user ID.
+    """
+    all_threads = [thread for threads in iter_threads_by_assigned_id(assigned_user_id) for thread in threads]
     print(f"Retrieved {len(all_threads)} total threads assigned to user ID '{assigned_user_id}'")
     return all_threads
 
-def get_threads_by_inbox(mailboxId):
+def iter_conversations_with_threads_by_inbox(mailboxId, max_workers=MAX_CONCURRENT_REQUESTS, query=None,
+                                             status="closed", conversation_filter=None, embed_threads=False,
+                                             max_pages=100, sort_field=None, sort_order="asc", listing=None):
     """
-    Gets all threads from conversations assigned to a specific user ID.
+    Pages through a mailbox once and yields `(conversations, threads)` for each page.
+
+    `conversations` is the full page of the listing and `threads` the threads of
+    those conversations, so both always describe the same set of conversations.
+    With `embed_threads=True` the threads are requested inline in the listing
+    (`embed=threads`) instead of one request per conversation; otherwise they
+    are fetched concurrently, with up to `max_workers` requests in flight, while
+    the next page is prefetched.
+
+    `query` defaults to DEFAULT_INBOX_QUERY; "" lists the whole mailbox. When
+    `conversation_filter` is given, threads are only returned for conversations
+    for which it returns True (used by incremental syncs to skip unchanged conversations).
+    `sort_field` (e.g. "modifiedAt") replaces the API's default createdAt order;
+    `listing` reports whether the listing completed (see _iter_conversations_with_threads).
     """
-    token = get_oauth_token()
-    if not token:
-        print("Failed to get OAuth token.")
-        return []
-
-    base_url = "https://api.helpscout.net/v2"
-    headers = {"Authorization": f"Bearer {token}"}
-    conversations_url = f"{base_url}/conversations"
-    
     params = {
-       "query": 'createdAt:[2025-01-01T00:00:00Z TO 2025-02-01T00:00:00Z]',
+        "query": DEFAULT_INBOX_QUERY if query is None else query,
         "mailbox": mailboxId,
-        "status": "closed",
+        "status": status,
         "pageSize": 50,
-        "page": 1
     }
-    
+    if not params["query"]:
+        del params["query"]
+    if sort_field:
+        params.update(sortField=sort_field, sortOrder=sort_order)
+    yield from _iter_conversations_with_threads(
+        params, f"mailbox ID {mailboxId}", max_workers=max_workers,
+        conversation_filter=conversation_filter, embed_threads=embed_threads, max_pages=max_pages,
+        listing=listing
+    )
+
+def get_conversations_and_threads_by_inbox(mailboxId, **kwargs):
+    """
+    Gets the conversations of a mailbox and their threads from a single listing.
+    Accepts the same keyword arguments as `iter_conversations_with_threads_by_inbox`.
+
+    Returns:
+        tuple: (all_conversations, all_threads)
+    """
+    all_conversations = []
     all_threads = []
-    page = 1
-    max_pages = 100  # Safety limit
-    
-    while page <= max_pages:
-        params['page'] = page
-        print(f"\nFetching conversations page {page} for mailbox ID {mailboxId}...", flush=True)
-        try:
-            response = session.get(conversations_url, headers=headers, params=params, timeout=30)
-            response.raise_for_status()
+    for conversations, threads in iter_conversations_with_threads_by_inbox(mailboxId, **kwargs):
+        all_conversations.extend(conversations)
+        all_threads.extend(threads)
 
-            data = response.json()
-            conversations = data.get('_embedded', {}).get('conversations', [])
-            print(f"  ✓ Got {len(conversations)} conversations, fetching threads...", flush=True)
-
-            for idx, conv in enumerate(conversations, 1):
-                conv_id = conv.get('id')
-                conv_number = conv.get('number')
-                print(f"    [{idx}/{len(conversations)}] Conv #{conv_number} (ID: {conv_id})...", end=' ', flush=True)
-
-                threads_url = f"{base_url}/conversations/{conv_id}/threads"
-                try:
-                    thread_resp = session.get(threads_url, headers=headers, timeout=30)
-                    thread_resp.raise_for_status()
-                    threads_data = thread_resp.json().get('_embedded', {}).get('threads', [])
-                    for thread in threads_data:
-                        thread['conversation_id'] = conv_id
-                        thread['conversation_number'] = conv_number
-                    all_threads.extend(threads_data)
-                    print(f"✓ {len(threads_data)} threads")
-                except requests.exceptions.Timeout:
-                    print(f"⚠️  Timeout, skipping")
-                    continue
-                except requests.exceptions.RequestException as e:
-                    print(f"❌ Error: {e}")
+    print(f"Retrieved {len(all_conversations)} conversations and {len(all_threads)} threads "
+          f"for mailbox ID '{mailboxId}'")
+    return all_conversations, all_threads
 
-            if '_links' in data and 'next' in data['_links']:
-                page += 1
-            else:
-                print("\n✓ Reached last page")
-                break
-        except requests.exceptions.Timeout:
-            print(f"⚠️  Timeout on page {page}, retrying...")
-            continue
-        except requests.exceptions.RequestException as e:
-            print(f"\n❌ Failed to fetch conversations page {page}: {e}")
-            break
+def iter_threads_by_inbox(mailboxId, **kwargs):
+    """
+    Yields, page by page, the threads of conversations in a specific mailbox.
+    Accepts the same keyword arguments as `iter_conversations_with_threads_by_inbox`.
+    """
+    for _, threads in iter_conversations_with_threads_by_inbox(mailboxId, **kwargs):
+        yield threads
+
+def get_threads_by_inbox(mailboxId, max_workers=MAX_CONCURRENT_REQUESTS, query=None, status="closed",
+                         conversation_filter=None):
+    """
+    Gets all threads from conversations in a specific mailbox.
+
+    Thread requests run concurrently, with up to `max_workers` in flight, while
+    the next conversations page is prefetched in the background.
+
+    `query` defaults to DEFAULT_INBOX_QUERY. When `conversation_filter` is given,
+    threads are only fetched for conversations for which it returns True
+    (used by incremental syncs to skip unchanged conversations).
+    """
+    pages = iter_threads_by_inbox(
+        mailboxId, max_workers=max_workers, query=query, status=status,
+        conversation_filter=conversation_filter
+    )
+    all_threads = [thread for threads in pages for thread in threads]
 
     print(f"Retrieved {len(all_threads)} total threads assigned to mailbox ID '{mailboxId}'")
     return all_threads
@@ -465,6 +674,7 @@ def threads_prep(raw_threads):
 def group_threads(df: pd.DataFrame) -> dict:
     """
     Agrupa mensagens em threads por `conversation_id`, ordenando por data.
+    Mensagens com o mesmo `createdAt` mantêm a ordem em que aparecem no DataFrame.
 
     Parâmetros:
         df (pd.DataFrame): DataFrame com colunas 'conversation_id', 'createdAt', 'author', 'normalized'
@@ -472,32 +682,30 @@ def group_threads(df: pd.DataFrame) -> dict:
     Retorna:
         dict: {conversation_id: texto_da_conversa_em_ordem_cronológica}
     """
-    texto_conversas = {}
-
     # Verifica se todas as colunas necessárias estão presentes
     required_columns = {'conversation_id', 'createdAt', 'author', 'type', 'normalized'}
     if not required_columns.issubset(df.columns):
         raise ValueError(f"DataFrame está faltando colunas: {required_columns - set(df.columns)}")
 
-    # Remove mensagens sem normalização
-    df_filtrado = df.dropna(subset=['normalized'])
-    df_filtrado = df_filtrado[df_filtrado['normalized'].str.strip() != ""]
+    # Remove mensagens sem normalização (e sem conversation_id, que o groupby descartaria)
+    df_filtrado = df.dropna(subset=['conversation_id', 'normalized'])
+    df_filtrado = df_filtrado[df_filtrado['normalized'].astype(str).str.strip() != ""]
+    if df_filtrado.empty:
+        return {}
 
-    # Agrupa por conversation_id
-    grouped = df_filtrado.groupby('conversation_id')
+    # Uma única ordenação global (estável) em vez de um sort_values por grupo
+    df_filtrado = df_filtrado.sort_values(['conversation_id', 'createdAt'], kind='mergesort')
 
-    for conv_id, group in grouped:
-        # Ordena por createdAt
-        sorted_group = group.sort_values(by='createdAt')
+    # Monta o texto de cada mensagem com operações de coluna, sem iterrows
+    mensagens = (
+        df_filtrado['author'].astype(str) + " em " + df_filtrado['createdAt'].astype(str)
+        + " (" + df_filtrado['type'].astype(str) + "):\n" + df_filtrado['normalized'].astype(str) + "\n"
+    )
 
-        # Concatena as mensagens normalizadas em ordem cronológica
-        msgs = [
-            f"{row['author']} em {row['createdAt']} ({row['type']}):\n{row['normalized']}\n"
-            for idx, row in sorted_group.iterrows()
-        ]
-        texto_conversas[conv_id] = "\n".join(msgs).strip()
+    # Junta as mensagens de cada conversa em uma única agregação
+    texto_conversas = mensagens.groupby(df_filtrado['conversation_id'], sort=True).agg("\n".join).str.strip()
 
-    return texto_conversas
+    return texto_conversas.to_dict()
 
 def extract_tags(tags_data):
     """
@@ -0,0 +1,148 @@
+"""
+Persistent cache for LLM responses.
+
+Responses are stored in a local SQLite file, keyed by a SHA-256 hash of the
+model, the generation options, the system prompt and the user prompt. A re-run
+with the same inputs (e.g. summaries when only the tagging prompt changed)
+reads the stored answer instead of calling the model again. The file is kept
+under `max_bytes` by evicting the least recently used responses.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from sqlite_store import SQLiteStore, hit_stats
+
+CACHE_PATH = 'data/llm_cache.sqlite'
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Set LLM_CACHE_BYPASS=1 to always call the model (fresh responses are still stored)
+CACHE_BYPASS = os.environ.get("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+
+def cache_key(model, options, system_prompt, prompt):
+    """Hash of everything that determines the model's answer."""
+    payload = json.dumps(
+        {"model": model, "options": options, "system": system_prompt, "prompt": prompt},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache(SQLiteStore):
+    """
+    SQLite response cache with size-bounded LRU eviction.
+
+    The global instance is used by every summarization and tagging worker; the
+    total size is tracked in memory so a write only scans the table when it
+    pushes the cache over `max_bytes`. Lookups are also counted per thread
+    (see thread_counts), so a caller can tell its own cache hits from those of
+    other stages running at the same time.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, bypass=CACHE_BYPASS):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._total_bytes = 0
+        self._local = threading.local()
+
+    def _create_schema(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        """Returns the cached response, or None (also counted as a miss when bypassed)."""
+        with self.lock:
+            if self.bypass:
+                self._count(hit=False)
+                return None
+            conn = self._connect()
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(hit=False)
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self._count(hit=True)
+            return row[0]
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+            self._local.hits = getattr(self._local, "hits", 0) + 1
+        else:
+            self.misses += 1
+            self._local.misses = getattr(self._local, "misses", 0) + 1
+
+    def thread_counts(self):
+        """(hits, misses) of the lookups made so far by the calling thread."""
+        return getattr(self._local, "hits", 0), getattr(self._local, "misses", 0)
+
+    def put(self, key, response, model=None):
+        """Stores a response and evicts the least recently used ones if the cache is over its size."""
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            previous = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        # Drop the oldest entries down to 90% of the limit, so eviction does not run on every write
+        target = self.max_bytes * 0.9
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def clear(self):
+        """Deletes every cached response."""
+        with self.lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+            self._total_bytes = 0
+
+    def stats(self):
+        """Returns hit/miss counters and the current cache size."""
+        with self.lock:
+            return {
+                **hit_stats(self.hits, self.misses),
+                "evictions": self.evictions,
+                "size_mb": round(self._total_bytes / 1024 / 1024, 2),
+                "bypass": self.bypass,
+            }
+
+    def report(self):
+        """Prints the cache counters."""
+        stats = self.stats()
+        bypass = " (bypassed)" if stats["bypass"] else ""
+        print(f"💾 LLM cache{bypass}: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['evictions']} evicted, {stats['size_mb']} MB")
+
+
+# Global cache shared by every llm_call
+llm_cache = LLMCache()
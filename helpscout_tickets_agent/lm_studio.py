@@ -1,23 +1,41 @@
 #%%
+import asyncio
 import ollama
 import os
 import re
+import threading
+from llm_cache import llm_cache, cache_key
 
 # Ollama client is automatically configured to use localhost:11434
 # No explicit client initialization needed
 
-def llm_call(prompt: str, system_prompt: str = "", model="llama3.1:8b") -> str:
+# Generation options sent with every request (also part of the cache key)
+LLM_OPTIONS = {
+    "num_predict": 8000,  # Equivalent to max_tokens
+    "temperature": 0.1,
+}
+
+
+def llm_call(prompt: str, system_prompt: str = "", model="llama3.1:8b", use_cache: bool = True) -> str:
     """
     Calls the local Ollama model with the given prompt and returns the response.
+    Responses are cached on disk (see llm_cache.py), so identical calls are only sent once.
 
     Args:
         prompt (str): The user prompt to send to the model.
         system_prompt (str, optional): The system prompt to send to the model. Defaults to "".
         model (str, optional): The Ollama model identifier (e.g., "llama3.1:8b", "mistral", "codellama").
+        use_cache (bool, optional): Set to False to skip the cache lookup for this call. Defaults to True.
 
     Returns:
         str: The response from the language model.
     """
+    key = cache_key(model, LLM_OPTIONS, system_prompt, prompt)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
     try:
         # Build messages array with system prompt if provided
         messages = []
@@ -28,19 +46,160 @@ def llm_call(prompt: str, system_prompt: str = "", model="llama3.1:8b") -> str:
         response = ollama.chat(
             model=model,
             messages=messages,
-            options={
-                "num_predict": 8000,  # Equivalent to max_tokens
-                "temperature": 0.1,
-            }
+            options=LLM_OPTIONS
         )
         
-        return response['message']['content']
+        content = response['message']['content']
+        # Empty answers are not cached, so they are retried on the next run
+        if content:
+            llm_cache.put(key, content, model=model)
+        return content
         
     except Exception as e:
         print(f"Ollama API error: {e}")
         return ""
     
 
+# ========================
+# Async client (streaming)
+# ========================
+
+# Requests sent at once by llm_map; Ollama serves up to OLLAMA_NUM_PARALLEL of them in parallel
+LLM_MAP_CONCURRENCY = 4
+
+# llm_map runs every batch on one event loop, kept alive on a daemon thread, so the
+# AsyncClient (and its HTTP connection pool) is created once and reused by every call
+_loop = None
+_loop_lock = threading.Lock()
+# One AsyncClient per event loop (an HTTP client cannot be shared between loops)
+_async_clients = {}
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Returns the event loop that runs llm_map's requests, starting its thread on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-map-loop", daemon=True).start()
+        return _loop
+
+
+def get_async_client() -> ollama.AsyncClient:
+    """Returns the shared Ollama AsyncClient for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    with _loop_lock:
+        # Clients of loops that have been closed (e.g. a finished asyncio.run) are dropped
+        for closed in [other for other in _async_clients if other.is_closed()]:
+            del _async_clients[closed]
+        if loop not in _async_clients:
+            _async_clients[loop] = ollama.AsyncClient()
+        return _async_clients[loop]
+
+
+def _truncate_at_stop(text: str, stop) -> tuple:
+    """Cuts `text` at the first stop sequence; returns (text, stopped)."""
+    positions = [text.find(sequence) for sequence in stop if sequence in text]
+    if not positions:
+        return text, False
+    return text[:min(positions)], True
+
+
+async def allm_call(prompt: str, system_prompt: str = "", model="llama3.1:8b", stop=None,
+                    max_chars: int = None, num_predict: int = None, use_cache: bool = True) -> str:
+    """
+    Async version of llm_call that streams the response and stops early.
+
+    Args:
+        prompt (str): The user prompt to send to the model.
+        system_prompt (str, optional): The system prompt to send to the model. Defaults to "".
+        model (str, optional): The Ollama model identifier.
+        stop (list, optional): Stop sequences; generation ends at the first one (not included).
+        max_chars (int, optional): Stop reading once the response reaches this many characters.
+        num_predict (int, optional): Token limit for the server (defaults to LLM_OPTIONS).
+        use_cache (bool, optional): Set to False to skip the cache lookup for this call. Defaults to True.
+
+    Returns:
+        str: The response from the language model ("" on error).
+    """
+    stop = list(stop or [])
+    options = dict(LLM_OPTIONS)
+    if num_predict is not None:
+        options["num_predict"] = num_predict
+    if stop:
+        options["stop"] = stop
+
+    # The caps change the answer, so they are part of the cache key
+    key = cache_key(model, {**options, "max_chars": max_chars}, system_prompt, prompt)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+
+    content = ""
+    try:
+        stream = await get_async_client().chat(model=model, messages=messages, options=options, stream=True)
+        try:
+            async for part in stream:
+                content += part['message']['content']
+                if stop:
+                    content, stopped = _truncate_at_stop(content, stop)
+                    if stopped:
+                        break
+                if max_chars is not None and len(content) >= max_chars:
+                    content = content[:max_chars]
+                    break
+        finally:
+            # Closing the stream drops the connection, which makes Ollama stop generating
+            await stream.aclose()
+    except Exception as e:
+        print(f"Ollama API error: {e}")
+        return ""
+
+    if content:
+        llm_cache.put(key, content, model=model)
+    return content
+
+
+async def allm_map(prompts, system_prompt: str = "", concurrency: int = LLM_MAP_CONCURRENCY, **kwargs) -> list:
+    """
+    Runs allm_call for every prompt with at most `concurrency` requests in flight.
+
+    Args:
+        prompts (list): User prompts, or (prompt, system_prompt) tuples.
+        system_prompt (str, optional): System prompt for the prompts given as plain strings.
+        concurrency (int, optional): Maximum number of simultaneous requests.
+        **kwargs: Passed to allm_call (model, stop, max_chars, num_predict, use_cache).
+
+    Returns:
+        list: Responses in the same order as `prompts`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        prompt, system = item if isinstance(item, tuple) else (item, system_prompt)
+        async with semaphore:
+            return await allm_call(prompt, system, **kwargs)
+
+    return await asyncio.gather(*(run(item) for item in prompts))
+
+
+def llm_map(prompts, system_prompt: str = "", concurrency: int = LLM_MAP_CONCURRENCY, **kwargs) -> list:
+    """
+    Synchronous wrapper around allm_map (same arguments and result).
+    Every call runs on the same background event loop and so shares one
+    AsyncClient; it also works inside a running event loop (e.g. a notebook),
+    where `await allm_map(...)` can be used directly instead.
+    """
+    coroutine = allm_map(prompts, system_prompt, concurrency, **kwargs)
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+
 def simple_call(input: str, prompt: str): 
     """Process the input based on the prompt guidance"""
     try:
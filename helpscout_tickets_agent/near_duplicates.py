@@ -0,0 +1,225 @@
+"""
+Near-duplicate conversation clustering (MinHash + LSH).
+
+Each conversation is reduced to the set of word 3-grams of its message bodies
+(text_processing.conversation_bodies, lowercased), and that set to
+a MinHash signature of MINHASH_PERMUTATIONS values. Two signatures agree on a
+position with probability close to the Jaccard similarity of the sets.
+Signatures use one-permutation hashing: every 3-gram is hashed once and falls
+in one of the bins, each bin keeps its smallest hash, and empty bins (short
+texts) borrow the next filled bin's value, so the cost is one hash per 3-gram
+rather than one per 3-gram and permutation.
+
+Signatures are split into LSH_BANDS bands; conversations sharing a whole band
+are candidates, and a candidate pair is kept when its signatures agree on at
+least `threshold` of the positions. Kept pairs are joined into clusters whose
+first conversation is the representative; members that are not themselves
+close to the representative (a chain of pairs drifting away) are left out.
+
+Everything runs on NumPy arrays, a chunk of texts at a time and without
+pairwise comparisons, so 100k conversations cluster in seconds. The workflow
+summarizes and tags one conversation per cluster and copies the result to the
+others.
+"""
+import time
+import numpy as np
+
+from text_processing import conversation_bodies
+
+MINHASH_PERMUTATIONS = 64  # signature length (a power of two)
+LSH_BANDS = 16  # 4 rows per band: pairs with Jaccard 0.8 share a band with probability > 0.999
+SHINGLE_WORDS = 3
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Texts hashed together (small chunks keep the per-byte arrays in cache)
+MINHASH_CHUNK_SIZE = 200
+
+_MAX_HASH = np.iinfo(np.uint64).max
+_PRIME = np.uint64(1099511628211)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+# Byte weights of the word hash: _PRIME ** position in the word (positions past 63 reuse the last weight)
+_BYTE_WEIGHTS = np.concatenate([[np.uint64(1)], np.cumprod(np.full(63, _PRIME, dtype=np.uint64))])
+
+
+def _word_hashes(texts):
+    """
+    Hashes of the whitespace-separated words of every text, computed on the UTF-8 bytes with array
+    operations (no Python string per word).
+
+    Returns:
+        tuple: (hashes, doc) where doc[i] is the index of the text word i comes from
+    """
+    encoded = [conversation_bodies(str(text)).lower().encode("utf-8") for text in texts]
+    data = np.frombuffer(b"\n".join(encoded), dtype=np.uint8)
+    text_of_byte = np.repeat(np.arange(len(encoded)), [len(e) + 1 for e in encoded])[:len(data)]
+
+    in_word = data > 32  # ASCII whitespace and control characters separate words
+    starts = in_word & ~np.concatenate([[False], in_word[:-1]])
+    positions = np.flatnonzero(in_word)
+    word_of_byte = np.cumsum(starts)[positions] - 1
+    word_starts = np.flatnonzero(starts)
+    offset = np.minimum(positions - word_starts[word_of_byte], len(_BYTE_WEIGHTS) - 1)
+    with np.errstate(over='ignore'):
+        weighted = (data[positions].astype(np.uint64) + np.uint64(1)) * _BYTE_WEIGHTS[offset]
+    hashes = np.add.reduceat(weighted, np.flatnonzero(np.diff(word_of_byte, prepend=-1))) if len(weighted) else weighted
+    return hashes, text_of_byte[word_starts]
+
+
+def _shingles(texts):
+    """
+    Hashes of the word SHINGLE_WORDS-grams of every text, concatenated.
+
+    Returns:
+        tuple: (hashes, doc) where doc[i] is the index of the text hashes[i] comes from
+    """
+    word_hashes, word_doc = _word_hashes(texts)
+    n = SHINGLE_WORDS
+
+    # n-gram hash over the concatenation, then drop the n-grams that cross into the next text
+    with np.errstate(over='ignore'):
+        hashes = word_hashes[:max(len(word_hashes) - n + 1, 0)].copy()
+        for offset in range(1, n):
+            hashes = hashes * _PRIME + word_hashes[offset:len(word_hashes) - n + 1 + offset]
+    doc = word_doc[:len(hashes)]
+    keep = doc == word_doc[n - 1:]
+    hashes, doc = hashes[keep], doc[keep]
+
+    # Texts shorter than n words are one shingle: all their words
+    lengths = np.bincount(word_doc, minlength=len(texts))
+    short = np.flatnonzero((lengths > 0) & (lengths < n))
+    if len(short):
+        first_word = np.searchsorted(word_doc, short)
+        short_hashes = word_hashes[first_word].copy()
+        with np.errstate(over='ignore'):
+            for offset in range(1, n - 1):
+                longer = lengths[short] > offset
+                short_hashes[longer] = short_hashes[longer] * _PRIME + word_hashes[first_word[longer] + offset]
+        hashes = np.concatenate([hashes, short_hashes])
+        doc = np.concatenate([doc, short])
+    return hashes, doc
+
+
+def minhash_signatures(texts, n_permutations=MINHASH_PERMUTATIONS):
+    """
+    One-permutation MinHash signatures of conversation texts.
+
+    Returns:
+        np.ndarray: (len(texts), n_permutations) uint64; rows of empty texts are all max
+    """
+    bin_bits = np.uint64(n_permutations.bit_length() - 1)
+    signatures = np.full((len(texts), n_permutations), _MAX_HASH, dtype=np.uint64)
+    for chunk_start in range(0, len(texts), MINHASH_CHUNK_SIZE):
+        hashes, doc = _shingles(texts[chunk_start:chunk_start + MINHASH_CHUNK_SIZE])
+        with np.errstate(over='ignore'):
+            mixed = hashes * _MIX
+            mixed ^= mixed >> np.uint64(29)
+            mixed *= _MIX
+        # Top bits pick the bin, the rest is the value compared within it
+        bins = (mixed >> (np.uint64(64) - bin_bits)).astype(np.int64)
+        values = mixed & (_MAX_HASH >> bin_bits)
+        # Flat view of the chunk's rows: the minimum is written in place
+        chunk = signatures[chunk_start:chunk_start + MINHASH_CHUNK_SIZE].reshape(-1)
+        np.minimum.at(chunk, doc * n_permutations + bins, values)
+    return _densify(signatures)
+
+
+def _densify(signatures):
+    """Fills each empty bin with the next filled bin of the row (circularly), tagged with the distance."""
+    n, width = signatures.shape
+    filled = signatures != _MAX_HASH
+    positions = np.where(filled, np.arange(width), 2 * width)
+    positions = np.concatenate([positions, np.where(filled, np.arange(width, 2 * width), 2 * width)], axis=1)
+    nearest = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :width]
+    has_any = filled.any(axis=1)
+    source = np.where(has_any[:, None], nearest % width, np.arange(width))
+    distance = np.where(has_any[:, None], nearest - np.arange(width), 0).astype(np.uint64)
+    dense = np.take_along_axis(signatures, source, axis=1)
+    with np.errstate(over='ignore'):
+        return np.where(has_any[:, None] & ~filled, dense + distance * _PRIME, dense)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_signatures(signatures, threshold=NEAR_DUPLICATE_THRESHOLD, bands=LSH_BANDS):
+    """
+    Clusters of near-duplicate signatures.
+
+    Returns:
+        np.ndarray: representative[i], the index of the representative of row i (i itself when alone)
+    """
+    n, n_permutations = signatures.shape
+    rows = n_permutations // bands
+    valid = signatures[:, 0] != _MAX_HASH  # empty texts never match
+
+    # Candidate pairs: rows sharing all the values of a band, paired with the first such row
+    candidates = np.flatnonzero(valid)
+    if len(candidates) < 2:
+        return np.arange(n)
+    firsts, others = [], []
+    with np.errstate(over='ignore'):
+        for band in range(bands):
+            key = signatures[:, band * rows]
+            for column in range(band * rows + 1, (band + 1) * rows):
+                key = key * _PRIME + signatures[:, column]
+            order = candidates[np.argsort(key[candidates], kind='stable')]
+            sorted_keys = key[order]
+            new_group = np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]])
+            group_first = order[np.maximum.accumulate(np.where(new_group, np.arange(len(order)), 0))]
+            firsts.append(group_first[~new_group])
+            others.append(order[~new_group])
+    pairs = np.unique(np.stack([np.concatenate(firsts), np.concatenate(others)], axis=1), axis=0)
+
+    # Keep the pairs whose signatures agree on at least `threshold` of the positions
+    if len(pairs):
+        agreement = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        pairs = pairs[agreement >= threshold]
+
+    # Union-find; the smallest index (first conversation) becomes the root
+    parent = list(range(n))
+    for a, b in pairs.tolist():
+        root_a, root_b = _find(parent, a), _find(parent, b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    representative = np.array([_find(parent, i) for i in range(n)], dtype=np.int64)
+
+    # A member reached through a chain of pairs may be far from the representative: leave it alone
+    members = np.flatnonzero(representative != np.arange(n))
+    if len(members):
+        agreement = (signatures[members] == signatures[representative[members]]).mean(axis=1)
+        drifted = members[agreement < threshold]
+        representative[drifted] = drifted
+    return representative
+
+
+def cluster_near_duplicates(conversations, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Groups near-duplicate conversations.
+
+    Args:
+        conversations (dict): {conversation_id: text}; the first conversation of a cluster is its representative
+        threshold (float): Minimum estimated Jaccard similarity of the word 3-gram sets
+
+    Returns:
+        dict: {conversation_id: representative conversation_id} for every conversation in a
+              cluster of two or more (representatives map to themselves)
+    """
+    started_at = time.perf_counter()
+    conv_ids = list(conversations)
+    if not conv_ids:
+        return {}
+    representative = cluster_signatures(minhash_signatures(list(conversations.values())), threshold)
+
+    clustered = np.zeros(len(conv_ids), dtype=bool)
+    members = representative != np.arange(len(conv_ids))
+    clustered[members] = True
+    clustered[representative[members]] = True
+    clusters = {conv_ids[i]: conv_ids[representative[i]] for i in np.flatnonzero(clustered)}
+
+    n_clusters = int(np.count_nonzero(clustered & ~members))
+    print(f"🔗 Near-duplicates: {int(members.sum())} of {len(conv_ids)} conversations join "
+          f"{n_clusters} clusters (Jaccard >= {threshold}) in {time.perf_counter() - started_at:.1f}s")
+    return clusters
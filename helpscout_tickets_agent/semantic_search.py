@@ -0,0 +1,293 @@
+"""
+Semantic search over the Help Scout vector store built by datastore.py.
+
+A batch of query texts is embedded in one pass (shared embedding service) and
+sent to each collection in a single `collection.query` call. Conversations are
+searched with the metadata filters (status, assignee, creation date; tags are
+matched on the returned candidates, since Chroma stores them as one string,
+and queries short of matches are repeated with more candidates),
+then the threads of those candidates are searched with the same query vectors.
+A conversation is ranked by its best score, its own or one of its threads',
+and comes back with its best matching threads grouped under it.
+
+Results of recent queries are kept in an LRU cache (per query text and
+filters), so repeated lookups from an interactive session skip the model and
+the database. Call `clear_cache()` after re-indexing.
+
+Usage:
+    python semantic_search.py "customer asks for a refund" --status closed --tag billing
+"""
+import argparse
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embeddings import EMBEDDING_MODEL, embed
+from vector_store import (
+    CHROMA_PATH, CONVERSATION_COLLECTION, THREAD_COLLECTION, CREATED_TS_KEY, get_collection, to_timestamp
+)
+
+SEARCH_RESULTS = 5
+# Conversations fetched per result before tag filtering and re-ranking with thread scores;
+# with a tag filter, queries short of results are repeated with this factor more candidates
+SEARCH_OVERFETCH = 4
+THREADS_PER_CONVERSATION = 3
+SEARCH_CACHE_SIZE = 256
+
+
+def _date_filter(value):
+    timestamp = to_timestamp(value)
+    if timestamp is None:
+        raise ValueError(f"Invalid date: {value!r} (expected YYYY-MM-DD or an ISO 8601 timestamp)")
+    return timestamp
+
+
+def build_where(status=None, assignee=None, created_after=None, created_before=None):
+    """Chroma `where` clause for the conversation filters (None when there is nothing to filter)."""
+    conditions = []
+    if status:
+        conditions.append({"status": status})
+    if assignee:
+        conditions.append({"assigned_to_email": assignee})
+    if created_after is not None:
+        conditions.append({CREATED_TS_KEY: {"$gte": _date_filter(created_after)}})
+    if created_before is not None:
+        conditions.append({CREATED_TS_KEY: {"$lt": _date_filter(created_before)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def _similarity(collection):
+    """Converts the collection's distances to cosine similarities (vectors are L2-normalized)."""
+    if (collection.metadata or {}).get("hnsw:space", "l2") in ("cosine", "ip"):
+        return lambda distance: 1.0 - distance
+    return lambda distance: 1.0 - distance / 2.0  # squared L2 between unit vectors = 2 - 2·cos
+
+
+def _has_tag(metadata, tags):
+    stored = {tag.strip().lower() for tag in str(metadata.get("tags", "")).split(",")}
+    return any(tag.lower() in stored for tag in tags)
+
+
+class SemanticSearch:
+    """
+    Batched, filtered similar-ticket search with an LRU cache of recent queries.
+
+    Args:
+        path (str): Chroma directory
+        model_name (str): Model used to build the collections
+        cache_size (int): Queries kept in the LRU cache (0 disables it)
+    """
+
+    def __init__(self, path=CHROMA_PATH, model_name=EMBEDDING_MODEL, cache_size=SEARCH_CACHE_SIZE):
+        self.conversations = get_collection(CONVERSATION_COLLECTION, path)
+        self.threads = get_collection(THREAD_COLLECTION, path)
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def search(self, queries, n_results=SEARCH_RESULTS, tags=None, status=None, assignee=None,
+               created_after=None, created_before=None, threads_per_conversation=THREADS_PER_CONVERSATION):
+        """
+        Similar past conversations for each query.
+
+        Args:
+            queries (list or str): Query texts (a single string is one query)
+            n_results (int): Conversations per query
+            tags (list or str, optional): Keep conversations with any of these tags
+            status (str, optional): Conversation status ("closed", "active", ...)
+            assignee (str, optional): E-mail of the assigned user
+            created_after / created_before (str or datetime, optional): Creation date range [after, before)
+            threads_per_conversation (int): Matching threads returned per conversation
+
+        Returns:
+            list: One ranked list per query of {"conversation_id", "score", "document",
+                  "metadata", "threads": [{"thread_id", "score", "document", "metadata"}]}
+        """
+        single = isinstance(queries, str)
+        queries = [queries] if single else list(queries)
+        tags = [tags] if isinstance(tags, str) else list(tags or [])
+        filters = (n_results, tuple(tags), status, assignee, str(created_after), str(created_before),
+                   threads_per_conversation)
+
+        results = [self._cache_get((query, filters)) for query in queries]
+        pending = list(dict.fromkeys(q for q, result in zip(queries, results) if result is None))
+        if pending:
+            found = dict(zip(pending, self._search(
+                pending, n_results, tags, build_where(status, assignee, created_after, created_before),
+                threads_per_conversation
+            )))
+            for query in pending:
+                self._cache_put((query, filters), found[query])
+            results = [found[q] if result is None else result for q, result in zip(queries, results)]
+        return results[0] if single else results
+
+    def _search(self, queries, n_results, tags, where, threads_per_conversation):
+        vectors = embed(queries, self.model_name)
+        total = self.conversations.count()
+        if not total or not n_results:
+            return [[] for _ in queries]
+
+        similarity = _similarity(self.conversations)
+        candidates = [{} for _ in queries]
+        pending = list(range(len(queries)))
+        n_candidates = n_results * SEARCH_OVERFETCH
+        while pending:
+            n_candidates = min(n_candidates, total)
+            hits = self.conversations.query(
+                query_embeddings=vectors[pending].tolist(), n_results=n_candidates, where=where,
+                include=["metadatas", "documents", "distances"]
+            )
+            short = []
+            for i, ids, metadatas, documents, distances in zip(
+                    pending, hits["ids"], hits["metadatas"], hits["documents"], hits["distances"]):
+                ranked = {}
+                for doc_id, metadata, document, distance in zip(ids, metadatas, documents, distances):
+                    if tags and not _has_tag(metadata, tags):
+                        continue
+                    ranked[metadata.get("id", doc_id)] = {
+                        "conversation_id": metadata.get("id", doc_id), "score": similarity(distance),
+                        "document": document, "metadata": metadata, "threads": [],
+                    }
+                candidates[i] = ranked
+                # Tags are matched here, not by Chroma: fetch more while matches may be left
+                if len(ranked) < n_results and len(ids) == n_candidates < total:
+                    short.append(i)
+            pending = short
+            n_candidates *= SEARCH_OVERFETCH
+
+        self._attach_threads(vectors, candidates, threads_per_conversation)
+        return [
+            sorted(ranked.values(), key=lambda hit: hit["score"], reverse=True)[:n_results]
+            for ranked in candidates
+        ]
+
+    def _attach_threads(self, vectors, candidates, threads_per_conversation):
+        """Searches the candidates' threads for every query at once and groups them by conversation."""
+        conversation_ids = sorted({conv_id for ranked in candidates for conv_id in ranked}, key=str)
+        if not conversation_ids or not threads_per_conversation:
+            return
+        n_threads = min(len(conversation_ids) * threads_per_conversation * 2, self.threads.count())
+        if not n_threads:
+            return
+        hits = self.threads.query(
+            query_embeddings=vectors.tolist(), n_results=n_threads,
+            where={"conversation_id": {"$in": conversation_ids}},
+            include=["metadatas", "documents", "distances"]
+        )
+        similarity = _similarity(self.threads)
+        for ranked, ids, metadatas, documents, distances in zip(
+                candidates, hits["ids"], hits["metadatas"], hits["documents"], hits["distances"]):
+            for doc_id, metadata, document, distance in zip(ids, metadatas, documents, distances):
+                conversation = ranked.get(metadata.get("conversation_id"))
+                if conversation is None or len(conversation["threads"]) >= threads_per_conversation:
+                    continue
+                score = similarity(distance)
+                conversation["threads"].append(
+                    {"thread_id": metadata.get("id", doc_id), "score": score, "document": document,
+                     "metadata": metadata}
+                )
+                conversation["score"] = max(conversation["score"], score)
+
+    def _cache_get(self, key):
+        result = self._cache.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def _cache_put(self, key, result):
+        if not self.cache_size:
+            return
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        """Forgets cached results (call after the collections were re-indexed)."""
+        self._cache.clear()
+
+
+def benchmark_search(queries, searcher=None, n_results=SEARCH_RESULTS, repeat=3):
+    """
+    Latency of one query at a time, of the whole batch in one call, and of cached lookups.
+
+    Returns:
+        dict: {"single_p50_ms", "single_p95_ms", "batch_ms_per_query", "cached_ms_per_query"}
+    """
+    searcher = searcher or SemanticSearch()
+    searcher.search(queries[:1], n_results)  # load the model and open the collections
+
+    single = []
+    for _ in range(repeat):
+        for query in queries:
+            searcher.clear_cache()
+            started_at = time.perf_counter()
+            searcher.search([query], n_results)
+            single.append(time.perf_counter() - started_at)
+
+    batch = float('inf')
+    for _ in range(repeat):
+        searcher.clear_cache()
+        started_at = time.perf_counter()
+        searcher.search(queries, n_results)
+        batch = min(batch, time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        searcher.search(queries, n_results)
+    cached = (time.perf_counter() - started_at) / repeat
+
+    timings = {
+        "single_p50_ms": round(float(np.percentile(single, 50)) * 1000, 2),
+        "single_p95_ms": round(float(np.percentile(single, 95)) * 1000, 2),
+        "batch_ms_per_query": round(batch / len(queries) * 1000, 2),
+        "cached_ms_per_query": round(cached / len(queries) * 1000, 3),
+    }
+    print(f"🔎 Search latency over {len(queries)} queries: one at a time p50 {timings['single_p50_ms']} ms, "
+          f"p95 {timings['single_p95_ms']} ms; batched {timings['batch_ms_per_query']} ms/query; "
+          f"cached {timings['cached_ms_per_query']} ms/query")
+    return timings
+
+
+def print_results(query, results):
+    print(f"\n🔎 {query}")
+    if not results:
+        print("  (no matches)")
+    for rank, hit in enumerate(results, 1):
+        metadata = hit["metadata"]
+        print(f"  {rank}. #{metadata.get('number', hit['conversation_id'])} {metadata.get('subject', '')} "
+              f"(score {hit['score']:.3f}, {metadata.get('status', '')}, {metadata.get('created_at', '')})")
+        for thread in hit["threads"]:
+            print(f"     - thread {thread['thread_id']} ({thread['score']:.3f}): {thread['document'][:120]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find similar past Help Scout conversations")
+    parser.add_argument("queries", nargs="+", help="Query texts")
+    parser.add_argument("-n", "--results", type=int, default=SEARCH_RESULTS)
+    parser.add_argument("--tag", action="append", help="Conversation tag (repeat for any of several)")
+    parser.add_argument("--status")
+    parser.add_argument("--assignee", help="E-mail of the assigned user")
+    parser.add_argument("--after", help="Created on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--before", help="Created before this date (YYYY-MM-DD)")
+    parser.add_argument("--benchmark", action="store_true", help="Measure query latency instead")
+    args = parser.parse_args()
+
+    searcher = SemanticSearch()
+    if args.benchmark:
+        benchmark_search(args.queries, searcher, args.results)
+    else:
+        batch = searcher.search(
+            args.queries, args.results, tags=args.tag, status=args.status, assignee=args.assignee,
+            created_after=args.after, created_before=args.before
+        )
+        for query, results in zip(args.queries, batch):
+            print_results(query, results)
@@ -0,0 +1,57 @@
+"""
+Common base of the local SQLite stores: the LLM response cache (llm_cache.py),
+the workflow checkpoints (checkpoints.py) and the embedding index (embeddings.py).
+
+Each store keeps one connection, opened in WAL mode the first time it is
+needed and shared by the worker threads behind `store.lock`. Caches count
+their lookups and report them with `hit_stats`.
+"""
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    Lazily opened SQLite file shared between threads.
+
+    Subclasses create their tables in `_create_schema(conn)` and hold `self.lock`
+    around every use of `self._connect()`.
+
+    Args:
+        path (str): SQLite file (its directory is created when needed)
+    """
+
+    # Extra PRAGMA statements run after journal_mode=WAL
+    pragmas = ()
+    # sqlite3 transaction handling: "" opens transactions implicitly, None is autocommit
+    isolation_level = ""
+    # Seconds to wait for another process holding the write lock
+    timeout = 5.0
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=self.isolation_level, timeout=self.timeout
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            for pragma in self.pragmas:
+                conn.execute(f"PRAGMA {pragma}")
+            self._create_schema(conn)
+            self._conn = conn
+        return self._conn
+
+    def _create_schema(self, conn):
+        """Creates the store's tables (and reads whatever state it keeps in memory)."""
+
+
+def hit_stats(hits, misses):
+    """{"hits", "misses", "hit_rate"} of a cache's lookups."""
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
@@ -7,6 +7,11 @@ import os
 # Add the path to access lm_studio.py
 #sys.path.append('/Users/strider/Zamp/GitHub/special_projects/customer_success_agent')
 from lm_studio import llm_call
+from text_processing import chunk_conversation, count_tokens
+
+# Token budget per call for long conversations, and context repeated between chunks
+MAX_CHUNK_TOKENS = 1500
+CHUNK_OVERLAP_TOKENS = 100
 
 #%% # Summarization function using LM Studio
 def summarize_with_lm_studio(text, system_prompt="You are a helpful assistant that summarizes customer support conversations."):
@@ -52,12 +57,15 @@ def summarize_conversations(texto_conversas, max_length=2000):
     print(f"Summarization complete! Processed {len(resumos)} conversations.")
     return resumos
 
-def summarize_long_conversations_lm_studio(texto_conversas, max_chunk_length=1500):
+def summarize_long_conversations_lm_studio(texto_conversas, max_chunk_tokens=MAX_CHUNK_TOKENS,
+                                           overlap_tokens=CHUNK_OVERLAP_TOKENS):
     """
     Resume conversas longas usando LM Studio, dividindo em chunks se necessário.
+    Os chunks respeitam os limites entre mensagens e o orçamento de tokens do modelo.
     Args:
         texto_conversas (dict): {conversation_id: texto_completo}
-        max_chunk_length (int): Maximum characters per chunk
+        max_chunk_tokens (int): Maximum tokens per chunk
+        overlap_tokens (int): Tokens of the previous chunk repeated at the start of the next one
     Returns:
         dict: {conversation_id: resumo}
     """
@@ -70,12 +78,12 @@ def summarize_long_conversations_lm_studio(texto_conversas, max_chunk_length=150
         print(f"Processing long conversation {i}/{total_conversations} (ID: {conv_id})")
         
         # If text is short enough, summarize directly
-        if len(texto) <= max_chunk_length:
+        if count_tokens(texto) <= max_chunk_tokens:
             resumo = summarize_with_lm_studio(texto)
             resumos[conv_id] = resumo
         else:
             # Split into chunks
-            chunks = [texto[i:i + max_chunk_length] for i in range(0, len(texto), max_chunk_length)]
+            chunks = chunk_conversation(texto, max_chunk_tokens, overlap_tokens)
             print(f"  Split into {len(chunks)} chunks")
             
             # Summarize each chunk
@@ -0,0 +1,115 @@
+"""
+Incremental sync state for Help Scout mailboxes.
+
+Keeps, per mailbox, a `modifiedAt` watermark plus the `modifiedAt` and
+`threadCount` last seen for each conversation, stored in a local JSON file.
+The ETL uses it to list only conversations changed since the previous run and
+to refetch threads only for conversations that actually changed.
+"""
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+STATE_PATH = 'data/sync_state.json'
+# The incremental query starts this long before the watermark: a conversation modified
+# while the previous listing was paged moves to its end and can be missed by that run
+WATERMARK_MARGIN = timedelta(minutes=5)
+
+
+def load_sync_state(path=STATE_PATH):
+    """
+    Load the sync state from disk.
+
+    Returns:
+        dict: {"mailboxes": {mailbox_id: {"watermark": str, "conversations": {...}}}}
+    """
+    if not os.path.exists(path):
+        return {"mailboxes": {}}
+    try:
+        with open(path, 'r') as file:
+            state = json.load(file)
+        state.setdefault("mailboxes", {})
+        return state
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️  Could not read sync state from {path}: {e}. Starting a full sync.")
+        return {"mailboxes": {}}
+
+
+def save_sync_state(state, path=STATE_PATH):
+    """Write the sync state atomically (temp file + rename)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file)
+    os.replace(tmp_path, path)
+
+
+def _mailbox_state(state, mailbox_id):
+    return state["mailboxes"].setdefault(str(mailbox_id), {"watermark": None, "conversations": {}})
+
+
+def get_watermark(state, mailbox_id):
+    """Return the latest `modifiedAt` seen for the mailbox, or None before the first sync."""
+    return _mailbox_state(state, mailbox_id)["watermark"]
+
+
+def incremental_query(state, mailbox_id, margin=WATERMARK_MARGIN):
+    """
+    Build the Help Scout search query for conversations modified since the last run,
+    `margin` before the watermark (re-listed unchanged conversations are skipped by
+    conversation_changed). Returns "" (no query: the whole mailbox) when the mailbox
+    was never synced.
+    """
+    watermark = get_watermark(state, mailbox_id)
+    if not watermark:
+        return ""
+    since = datetime.fromisoformat(watermark.replace("Z", "+00:00")) - margin
+    return f'modifiedAt:[{since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")} TO *]'
+
+
+def conversation_changed(state, mailbox_id, conv):
+    """True if the conversation is new or its `modifiedAt`/`threadCount` changed since the last sync."""
+    seen = _mailbox_state(state, mailbox_id)["conversations"].get(str(conv.get('id')))
+    if seen is None:
+        return True
+    return (seen.get("modifiedAt") != conv.get('modifiedAt')
+            or seen.get("threadCount") != conv.get('threadCount'))
+
+
+def record_conversations(state, mailbox_id, conversations, complete=True, failed_ids=()):
+    """
+    Store the fetched conversations in the state and advance the mailbox watermark.
+
+    Conversations whose threads failed to download (`failed_ids`) are not stored,
+    so the next run fetches them again, and the watermark stops at the earliest of
+    them. The watermark only moves when the listing was `complete` (sorted by
+    modifiedAt and read up to its last page): otherwise the unread pages may hold
+    changes older than the ones seen.
+    """
+    mailbox = _mailbox_state(state, mailbox_id)
+    failed = {str(conv_id) for conv_id in failed_ids}
+    watermark = None
+    failed_watermark = None
+    for conv in conversations:
+        modified_at = conv.get('modifiedAt')
+        if str(conv.get('id')) in failed:
+            # ISO-8601 UTC timestamps compare correctly as strings
+            if modified_at and (not failed_watermark or modified_at < failed_watermark):
+                failed_watermark = modified_at
+            mailbox["conversations"].pop(str(conv.get('id')), None)
+            continue
+        mailbox["conversations"][str(conv.get('id'))] = {
+            "modifiedAt": modified_at,
+            "threadCount": conv.get('threadCount'),
+        }
+        if modified_at and (not watermark or modified_at > watermark):
+            watermark = modified_at
+
+    if not complete:
+        print("⚠️  Conversation listing incomplete: sync watermark not advanced")
+        return state
+    if failed_watermark and (not watermark or failed_watermark < watermark):
+        watermark = failed_watermark
+    if watermark and (not mailbox["watermark"] or watermark > mailbox["watermark"]):
+        mailbox["watermark"] = watermark
+    return state
@@ -0,0 +1,74 @@
+"""
+Embedding-based tag retrieval.
+
+The tag catalogue (tag name + description) and the conversation summaries are
+embedded through the shared embedding service (embeddings.py), which caches
+every vector on disk, so the catalogue is only encoded again when a tag
+changes. Summaries are compared with every tag in a single matrix product
+(cosine similarity), which gives each conversation a shortlist of candidate
+tags for the LLM prompt, or its tags directly in the no-LLM mode.
+"""
+import numpy as np
+
+from embeddings import EMBEDDING_MODEL, embed
+
+
+def _tag_text(tag, description):
+    return f"{tag}: {description}"
+
+
+class TagRetriever:
+    """
+    Cosine-similarity search over the tag catalogue.
+
+    Args:
+        tag_definitions (dict): {tag: description}
+        model_name (str): sentence-transformers model used for tags and summaries
+    """
+
+    def __init__(self, tag_definitions, model_name=EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.tags = list(tag_definitions)
+        self.vectors = embed([_tag_text(tag, desc) for tag, desc in tag_definitions.items()], model_name)
+        print(f"✓ {len(self.tags)} tag embeddings ready")
+
+    def scores(self, texts):
+        """Cosine similarity of each text with every tag: (len(texts), len(tags)) matrix."""
+        if not len(texts) or not self.tags:
+            return np.zeros((len(texts), len(self.tags)), dtype=np.float32)
+        return embed(texts, self.model_name) @ self.vectors.T
+
+    def top_k(self, texts, k=10, min_score=None):
+        """
+        The k most similar tags for each text, best first.
+
+        Args:
+            texts (list): Texts to match (e.g. conversation summaries)
+            k (int): Number of tags per text
+            min_score (float, optional): Drop tags below this cosine similarity
+
+        Returns:
+            list: One list of (tag, score) tuples per text
+        """
+        scores = self.scores(texts)
+        k = min(k, len(self.tags))
+        if not k:
+            return [[] for _ in texts]
+        # argpartition finds the k best in O(n); only those k are sorted
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        results = []
+        for row_tags, row_scores in zip(best, best_scores):
+            results.append([
+                (self.tags[i], float(score)) for i, score in zip(row_tags, row_scores)
+                if min_score is None or score >= min_score
+            ])
+        return results
+
+    def shortlist(self, texts, k=10):
+        """The k most similar tag names for each text (candidates for the LLM prompt)."""
+        return [[tag for tag, _ in matches] for matches in self.top_k(texts, k)]
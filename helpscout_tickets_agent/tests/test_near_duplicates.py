@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from near_duplicates import cluster_near_duplicates  # noqa: E402
+
+TICKET = ("Cliente em 2025-01-02 (customer):\n"
+          "the plugin upgrade failed and the sales tax report shows the wrong state percentage for march")
+
+
+def test_all_empty_conversations_are_not_clustered():
+    assert cluster_near_duplicates({1: "", 2: "", 3: "Cliente em 2025-01-02 (customer):\n"}) == {}
+
+
+def test_single_valid_conversation_is_not_clustered():
+    assert cluster_near_duplicates({1: "", 2: TICKET, 3: ""}) == {}
+
+
+def test_near_duplicates_map_to_the_first_conversation():
+    clusters = cluster_near_duplicates({1: TICKET, 2: "unrelated text about invoices and refunds", 3: TICKET + " thanks"})
+    assert clusters == {1: 1, 3: 1}
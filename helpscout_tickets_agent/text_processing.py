@@ -0,0 +1,471 @@
+"""
+Text processing shared by the ETL scripts (etl.py and workflow_graph.py).
+
+HTML bodies are turned into text by a streaming tag stripper that gives the
+same result as BeautifulSoup's get_text without building a tree. Cleaning
+(signature removal and URL/e-mail/phone scrubbing) uses regexes compiled once
+at import. Normalization runs spaCy in batches through `nlp.pipe`, with only
+the components lemmatization needs loaded (the parser and NER are excluded).
+"""
+import hashlib
+import re
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from html import unescape
+from html.entities import html5 as HTML5_ENTITIES
+from html.parser import HTMLParser
+import spacy
+from bs4 import BeautifulSoup
+from tqdm.auto import tqdm
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional, the default backend only needs the standard library
+    lxml = None
+
+try:
+    import tiktoken
+except ImportError:  # optional: token counts fall back to a characters-per-token estimate
+    tiktoken = None
+
+# ========================
+# HTML to text
+# ========================
+
+# "stream" (standard library tag stripper), "lxml" or "bs4" (BeautifulSoup reference).
+# "lxml" is approximate: its parser repairs the markup, so the text can differ from get_text
+HTML_BACKEND = "stream"
+
+# Strings inside these tags are not returned by BeautifulSoup.get_text()
+NON_TEXT_TAGS = frozenset({"script", "style", "template", "rt", "rp"})
+# Tags that never have content (closed as soon as they are opened)
+VOID_TAGS = frozenset({
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image",
+    "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source",
+    "spacer", "track", "wbr",
+})
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """
+    Streaming equivalent of `BeautifulSoup(html, 'html.parser').get_text(separator=' ', strip=True)`.
+
+    The text between two markup events forms one string, as in BeautifulSoup's
+    tree; strings are stripped, empty ones dropped, and text inside
+    NON_TEXT_TAGS is skipped. Only the stack of open tag names is kept.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.strings = []
+        self._data = []
+        self._open_tags = []
+        self._non_text_depth = 0
+
+    def _end_data(self):
+        if self._data:
+            text = "".join(self._data).strip()
+            self._data = []
+            if text and not self._non_text_depth:
+                self.strings.append(text)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        self._data.append(unescape(f"&#{name};"))
+
+    def handle_entityref(self, name):
+        # Unknown entities are kept as literal text, without the semicolon (as BeautifulSoup does)
+        self._data.append(HTML5_ENTITIES.get(f"{name};", f"&{name}"))
+
+    def handle_starttag(self, tag, attrs):
+        self._end_data()
+        if tag in VOID_TAGS:
+            return
+        self._open_tags.append(tag)
+        if tag in NON_TEXT_TAGS:
+            self._non_text_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_data()
+
+    def handle_endtag(self, tag):
+        self._end_data()
+        if tag not in self._open_tags:
+            return
+        # Like BeautifulSoup, closing a tag also closes everything opened inside it
+        while True:
+            name = self._open_tags.pop()
+            if name in NON_TEXT_TAGS:
+                self._non_text_depth -= 1
+            if name == tag:
+                break
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA["):
+            self._data.append(data[len("CDATA["):])
+            self._end_data()
+
+    def get_text(self):
+        self.close()
+        self._end_data()
+        return " ".join(self.strings)
+
+
+def _strip_html_stream(html):
+    extractor = _HTMLTextExtractor()
+    extractor.feed(html)
+    return extractor.get_text()
+
+
+def _lxml_strings(element, skip):
+    # Comments and processing instructions have a non-string tag; only their tail is text
+    is_element = isinstance(element.tag, str)
+    skip_inner = skip or (is_element and element.tag in NON_TEXT_TAGS)
+    if is_element and element.text and not skip_inner:
+        yield element.text
+    if is_element:
+        for child in element:
+            yield from _lxml_strings(child, skip_inner)
+    if element.tail and not skip:
+        yield element.tail
+
+
+def _strip_html_lxml(html):
+    """
+    Approximation of get_text: lxml repairs broken markup and merges the text around
+    dropped tags, so words from separate blocks can be joined ("x</p>y" gives "xy",
+    "<p>one<p>two</div>three" gives "one twothree"), and entities without a ";"
+    such as "&noti" are decoded differently.
+    """
+    if lxml is None:
+        raise ImportError("lxml is not installed; use the 'stream' backend")
+    try:
+        root = lxml.html.fromstring(html)
+    except Exception:  # lxml rejects empty or whitespace-only documents
+        return ""
+    strings = (text.strip() for text in _lxml_strings(root, skip=False))
+    return " ".join(text for text in strings if text)
+
+
+def _strip_html_bs4(html):
+    return BeautifulSoup(html, 'html.parser').get_text(separator=' ', strip=True)
+
+
+HTML_BACKENDS = {
+    "stream": _strip_html_stream,
+    "lxml": _strip_html_lxml,
+    "bs4": _strip_html_bs4,
+}
+
+
+def strip_html(html: str, backend: str = HTML_BACKEND) -> str:
+    """
+    Convert an HTML message body to plain text: the same output as get_text(separator=' ', strip=True)
+    with the "stream" and "bs4" backends, an approximation with "lxml" (see _strip_html_lxml).
+    """
+    if not html:
+        return ""
+    return HTML_BACKENDS[backend](str(html))
+
+
+def html_process_pool(n_process):
+    """Process pool for `strip_html_many`, or a no-op context (None) when n_process <= 1."""
+    return ProcessPoolExecutor(max_workers=n_process) if n_process > 1 else nullcontext(None)
+
+
+def strip_html_many(bodies, backend: str = HTML_BACKEND, executor=None, chunksize=64):
+    """
+    Convert a list of HTML bodies to text, in order.
+    Pass an executor from `html_process_pool` to spread the work over several processes.
+    """
+    convert = partial(strip_html, backend=backend)
+    if executor is None:
+        return [convert(body) for body in bodies]
+    return list(executor.map(convert, bodies, chunksize=chunksize))
+
+# ========================
+# Cleaning
+# ========================
+
+FAREWELL_WORDS = (
+    r"best|regards|kind regards|warm regards|sincerely|thanks|thank you|cheers|respectfully|"
+    r"yours truly|yours sincerely|yours faithfully|take care|atenciosamente|obrigado|agradeço|abs"
+)
+COMMON_TITLES = (
+    r"manager|analyst|engineer|developer|designer|director|ceo|cto|founder|consultant|"
+    r"coordinator|president|gerente|assistant|controller|accountant"
+)
+
+# Farewell line followed by up to three lines mentioning a job title
+SIGNATURE_RE = re.compile(
+    rf"(?:^|\n)[ \t]*({FAREWELL_WORDS})[^\n]*\n"
+    rf"(?:.*({COMMON_TITLES}).*\n*){{0,3}}",
+    re.IGNORECASE | re.MULTILINE
+)
+URL_RE = re.compile(r"https?://\S+")
+# Same matches as r"[\w\.-]+@[\w\.-]+": the leftmost match always starts a
+# run of [\w.-], so the lookbehind only skips hopeless starting positions
+EMAIL_RE = re.compile(r"(?<![\w.-])[\w.-]+@[\w.-]+")
+# Same matches as r"\(?\d{2,3}\)?[\s-]?\d{3,5}[\s-]?\d{4}", written to start
+# with a character class so the regex engine can jump between candidates
+PHONE_RE = re.compile(r"[(\d](?:(?<=\()\d{2,3}|(?<=\d)\d{1,2})\)?[\s-]?\d{3,5}[\s-]?\d{4}")
+WHITESPACE_RE = re.compile(r"\s{2,}")
+LINE_BREAKS = str.maketrans({"\n": " ", "\r": None})
+
+
+def remove_signature(text: str) -> str:
+    """Remove email signatures using patterns and farewell words."""
+    text = str(text)
+    # The pattern needs a line break after the farewell line
+    if "\n" in text:
+        text = SIGNATURE_RE.sub('', text)
+    return text.strip()
+
+
+def clean_body(text: str) -> str:
+    """Remove URLs, emails, phones, line breaks and extra spaces."""
+    text = URL_RE.sub("", str(text))
+    if "@" in text:
+        text = EMAIL_RE.sub("", text)
+    text = PHONE_RE.sub("", text)
+    text = WHITESPACE_RE.sub(" ", text)
+    return text.translate(LINE_BREAKS).strip()
+
+
+def clean_message(text: str) -> str:
+    """Signature removal followed by clean_body: the text that goes into normalization."""
+    return clean_body(remove_signature(text))
+
+
+# Rough size of a prompt for budgeting and reporting (~4 characters per token
+# for English text with Llama-style tokenizers); no tokenizer is loaded
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of LLM tokens in `text`."""
+    return -(-len(text) // CHARS_PER_TOKEN) if text else 0
+
+# ========================
+# Chunking
+# ========================
+
+# Llama 3's tokenizer is a tiktoken BPE that extends cl100k_base (the first
+# 100k merges are the same), so cl100k counts are a close match for llama3.1
+TOKENIZER_ENCODING = "cl100k_base"
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in `text` with the model's tokenizer (estimate_tokens if tiktoken is missing)."""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is None:
+        return estimate_tokens(text)
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+# group_threads joins messages as "header:\nbody\n" + "\n", so a blank line separates messages
+MESSAGE_SEPARATOR = "\n\n"
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _split_oversized(text, max_tokens, count):
+    """Split a message larger than the budget at sentence ends, or between words for run-on text."""
+    units = []
+    for sentence in SENTENCE_END_RE.split(text):
+        # Normalized text has no punctuation left, so a "sentence" can be the whole message
+        if count(sentence) > max_tokens:
+            units.extend(sentence.split())
+        else:
+            units.append(sentence)
+
+    pieces = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = count(unit) + 1  # + the joining space
+        if current and current_tokens + unit_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_conversation(text: str, max_tokens: int, overlap_tokens: int = 0, count=count_tokens) -> list:
+    """
+    Split a conversation (as built by group_threads) into chunks of about `max_tokens` tokens at most
+    (message counts are added up, so merges across message boundaries are not accounted for).
+
+    Whole messages are packed into each chunk; a message larger than the budget
+    is split at sentence (or word) boundaries. Each chunk after the first starts
+    with the last messages of the previous one, up to `overlap_tokens`.
+
+    Args:
+        text (str): Conversation text
+        max_tokens (int): Token budget per chunk
+        overlap_tokens (int): Tokens of context repeated from the previous chunk
+        count (callable): Token counter (count_tokens by default)
+
+    Returns:
+        list: Chunks in order (a single chunk when the text fits the budget)
+    """
+    if count(text) <= max_tokens:
+        return [text]
+
+    separator_tokens = count(MESSAGE_SEPARATOR)
+    messages = []
+    for message in text.split(MESSAGE_SEPARATOR):
+        message_tokens = count(message)
+        if message_tokens > max_tokens:
+            messages.extend((piece, count(piece)) for piece in _split_oversized(message, max_tokens, count))
+        elif message:
+            messages.append((message, message_tokens))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for message, message_tokens in messages:
+        if current and current_tokens + separator_tokens + message_tokens > max_tokens:
+            chunks.append(MESSAGE_SEPARATOR.join(m for m, _ in current))
+            # Carry the tail of the chunk over as context, if it leaves room for this message
+            overlap = []
+            overlap_size = 0
+            for previous, previous_tokens in reversed(current):
+                size = overlap_size + previous_tokens + separator_tokens
+                if size > overlap_tokens or size + message_tokens > max_tokens:
+                    break
+                overlap.insert(0, (previous, previous_tokens))
+                overlap_size = size
+            current, current_tokens = overlap, overlap_size
+        current.append((message, message_tokens))
+        current_tokens += message_tokens + (separator_tokens if len(current) > 1 else 0)
+    if current:
+        chunks.append(MESSAGE_SEPARATOR.join(m for m, _ in current))
+    return chunks
+
+
+# Message header written by group_threads: "author em createdAt (type):"
+MESSAGE_HEADER_RE = re.compile(r".* em \S+ \([^()\n]*\):")
+
+
+def conversation_bodies(text: str) -> str:
+    """Message bodies of a conversation (as built by group_threads): the text without its header lines."""
+    # Only lines ending in "):" can be headers; bodies are long single lines, not worth a regex scan
+    return "\n".join(
+        line for line in text.split("\n") if not (line.endswith("):") and MESSAGE_HEADER_RE.fullmatch(line))
+    )
+
+
+def conversation_content(text: str) -> str:
+    """Message bodies of a conversation, lowercased and single-spaced."""
+    return " ".join(conversation_bodies(text).lower().split())
+
+
+def content_hash(text: str) -> str:
+    """Hash of conversation_content: conversations saying the same thing get the same hash,
+    whoever wrote them and whenever."""
+    return hashlib.sha1(conversation_content(text).encode("utf-8")).hexdigest()
+
+# ========================
+# Normalization
+# ========================
+
+SPACY_MODEL = "en_core_web_sm"
+# Lemma/stopword filtering only needs tok2vec, tagger, attribute_ruler and lemmatizer
+EXCLUDED_COMPONENTS = ["parser", "ner"]
+
+# Defaults for nlp.pipe; raise n_process to spread normalization over several cores
+NORMALIZE_BATCH_SIZE = 256
+NORMALIZE_N_PROCESS = 1
+
+_nlp = None
+
+
+def get_nlp():
+    """Load the spaCy model once, without the components normalization does not use."""
+    global _nlp
+    if _nlp is None:
+        _nlp = spacy.load(SPACY_MODEL, exclude=EXCLUDED_COMPONENTS)
+    return _nlp
+
+
+def _doc_to_normalized(doc) -> str:
+    return " ".join(token.lemma_ for token in doc if not token.is_punct and not token.is_stop)
+
+
+def spacy_normalize(text: str) -> str:
+    """Lemmatize and remove punctuation and stopwords using spaCy (single text)."""
+    return _doc_to_normalized(get_nlp()(text))
+
+
+def _report_throughput(count, started_at):
+    elapsed = time.perf_counter() - started_at
+    rate = count / elapsed if elapsed else 0.0
+    print(f"✓ Normalized {count} docs in {elapsed:.1f}s ({rate:.1f} docs/sec)")
+
+
+def normalize_texts(texts, batch_size=NORMALIZE_BATCH_SIZE, n_process=NORMALIZE_N_PROCESS,
+                    desc="Normalizing messages"):
+    """
+    Lemmatize and remove punctuation and stopwords for a list of texts with `nlp.pipe`.
+
+    Args:
+        texts (list): Texts to normalize
+        batch_size (int): Number of texts per spaCy batch
+        n_process (int): Number of worker processes used by spaCy
+        desc (str): Label of the progress bar
+
+    Returns:
+        list: Normalized texts, in the same order as `texts`
+    """
+    texts = [str(text) for text in texts]
+    started_at = time.perf_counter()
+    docs = get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process)
+    normalized = [_doc_to_normalized(doc) for doc in tqdm(docs, total=len(texts), desc=desc)]
+    _report_throughput(len(normalized), started_at)
+    return normalized
+
+
+def iter_normalize_texts(items, batch_size=NORMALIZE_BATCH_SIZE, n_process=NORMALIZE_N_PROCESS):
+    """
+    Streaming version of `normalize_texts`.
+
+    Args:
+        items (iterable): `(text, context)` pairs; the iterable is consumed lazily
+        batch_size (int): Number of texts per spaCy batch
+        n_process (int): Number of worker processes used by spaCy
+
+    Yields:
+        tuple: `(normalized_text, context)`, in input order
+    """
+    count = 0
+    started_at = time.perf_counter()
+    docs = get_nlp().pipe(
+        ((str(text), context) for text, context in items),
+        as_tuples=True, batch_size=batch_size, n_process=n_process
+    )
+    for doc, context in docs:
+        count += 1
+        yield _doc_to_normalized(doc), context
+    _report_throughput(count, started_at)
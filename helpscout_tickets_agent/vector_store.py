@@ -0,0 +1,236 @@
+"""
+Bulk indexing of Help Scout records into ChromaDB.
+
+Records arrive as an iterable (e.g. straight from the paged fetchers in
+help_functions), are grouped into chunks of UPSERT_BATCH_SIZE, embedded with one
+batched call to the shared embedding service (embeddings.py, which skips texts
+it has already encoded) and written with one `collection.upsert` per chunk.
+Upsert makes a re-run idempotent: records already in the collection are
+overwritten instead of failing on duplicate ids.
+
+Each record stores a hash of its content (and of the embedding model) in its
+metadata. Every chunk is compared with what the collection holds before
+encoding, so only new or changed documents are embedded; unchanged ones cost a
+metadata lookup, and records whose metadata alone changed are updated without
+a new embedding.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from embeddings import EMBEDDING_MODEL, embed
+from help_functions import extract_tags
+
+CHROMA_PATH = './chroma'
+CONVERSATION_COLLECTION = 'convo-helpscout'
+THREAD_COLLECTION = 'thread-helpscout'
+# Records embedded and written per collection.upsert call (capped by the client's max batch size)
+UPSERT_BATCH_SIZE = 512
+# Metadata field holding document_hash(content)
+CONTENT_HASH_KEY = 'content_hash'
+# Metadata field with the creation time as a Unix timestamp (Chroma only compares numbers)
+CREATED_TS_KEY = 'created_ts'
+
+
+def clean_metadata(metadata):
+    """Replaces None values in a dictionary with empty strings for ChromaDB compatibility."""
+    return {k: ('' if v is None else v) for k, v in metadata.items()}
+
+
+def to_timestamp(value):
+    """Unix timestamp of an ISO 8601 date ("2025-05-12T20:20:18Z") or datetime (UTC unless
+    it says otherwise); None if empty or invalid."""
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def create_conversation_content(convo):
+    """
+    Generates a descriptive content string for a Help Scout conversation.
+
+    Args:
+        convo (dict): A flattened conversation dictionary.
+
+    Returns:
+        str: A descriptive string summarizing the conversation.
+    """
+    content = (
+        f"Conversation #{convo.get('number')} is about '{convo.get('subject', 'N/A')}'. "
+        f"It was created on {convo.get('created_at', 'N/A')} and last modified on {convo.get('modified_at', 'N/A')}. "
+        f"The current status is {convo.get('status', 'N/A')} with a state of {convo.get('state', 'N/A')}. "
+        f"It has {convo.get('thread_count', 0)} threads. "
+        f"The conversation is with {convo.get('customer_email', 'N/A')} and is assigned to {convo.get('assigned_to_email', 'N/A')}. "
+        f"Tags: {convo.get('tags', 'None')}. "
+        f"Source: {convo.get('source_type', 'N/A')} via {convo.get('source_via', 'N/A')}."
+    )
+    return content
+
+
+def create_thread_content(thread):
+    """
+    Generates a descriptive content string for a Help Scout thread.
+
+    Args:
+        thread (dict): A flattened thread dictionary.
+
+    Returns:
+        str: A descriptive string summarizing the thread.
+    """
+    content = (
+        f"Thread ID {thread.get('id')} from conversation #{thread.get('conversation_number')}. "
+        f"Type: {thread.get('type', 'N/A')}, Status: {thread.get('status', 'N/A')}. "
+        f"Created at: {thread.get('createdAt', 'N/A')}. "
+        f"From: {thread.get('customer_email', 'N/A')}, To: {thread.get('to', 'N/A')}. "
+        f"Assigned to: {thread.get('assignedTo_email', 'N/A')}. "
+        f"Body: {thread.get('body', '')[:200]}... "  # Truncate body for brevity
+        f"Source: {thread.get('source_type', 'N/A')} via {thread.get('source_via', 'N/A')}."
+    )
+    return content
+
+
+def iter_records(items, flatten, create_content):
+    """
+    Turns raw API objects into (id, content, metadata) records.
+
+    Args:
+        items (iterable): Raw conversations or threads
+        flatten (callable): flatten_convo / flatten_thread
+        create_content (callable): create_conversation_content / create_thread_content
+
+    Yields:
+        tuple: (doc_id, content, cleaned metadata with CREATED_TS_KEY)
+    """
+    for item in items:
+        metadata = clean_metadata(flatten(item))
+        # Help Scout tag objects carry their name under 'tag' (flatten_convo looks for 'name')
+        if isinstance(item.get('tags'), list):
+            metadata['tags'] = ', '.join(extract_tags(item['tags']))
+        # Conversations have created_at, threads createdAt
+        created_ts = to_timestamp(metadata.get('created_at') or metadata.get('createdAt'))
+        if created_ts is not None:
+            metadata[CREATED_TS_KEY] = created_ts
+        yield str(metadata.get('id', '')), create_content(metadata), metadata
+
+
+def document_hash(content, model_name=EMBEDDING_MODEL):
+    """Hash of a document's embedding input: changes when the content or the model changes."""
+    return hashlib.sha1(f"{model_name}\n{content}".encode("utf-8")).hexdigest()
+
+
+def batched(iterable, size):
+    """Consecutive lists of `size` items (the last one may be shorter)."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def get_collection(name, path=CHROMA_PATH):
+    """Opens (or creates) a persistent Chroma collection."""
+    from chromadb import PersistentClient
+    return PersistentClient(path=path).get_or_create_collection(name=name)
+
+
+def _max_batch_size(collection, requested):
+    # Chroma rejects writes larger than what its SQLite backend can bind in one statement
+    try:
+        return min(requested, collection._client.get_max_batch_size())
+    except AttributeError:
+        return requested
+
+
+def index_records(collection, records, model_name=EMBEDDING_MODEL, delete_missing=False,
+                  upsert_batch_size=UPSERT_BATCH_SIZE):
+    """
+    Embeds and upserts the new or changed records, one chunk at a time.
+
+    Args:
+        collection: Chroma collection
+        records (iterable): (doc_id, content, metadata) tuples, consumed lazily
+        model_name (str): sentence-transformers model
+        delete_missing (bool or callable): `records` is the full dataset: delete stored ids it did
+            not contain. A callable is asked once `records` is consumed, e.g. whether the fetch
+            behind it completed, so a partial fetch never deletes anything
+        upsert_batch_size (int): Records per lookup + encode + upsert round
+
+    Returns:
+        dict: {"records", "embedded", "metadata_updated", "unchanged", "deleted", "batches",
+               "encode_seconds", "upsert_seconds", "elapsed_seconds"}
+    """
+    batch_size = _max_batch_size(collection, upsert_batch_size)
+    stats = {
+        "records": 0, "embedded": 0, "metadata_updated": 0, "unchanged": 0, "deleted": 0, "batches": 0,
+        "encode_seconds": 0.0, "upsert_seconds": 0.0,
+    }
+    seen_ids = set()
+    started_at = time.perf_counter()
+
+    for batch in batched(records, batch_size):
+        # Chroma rejects repeated ids within one write; the last version of a record wins
+        batch = list({doc_id: (doc_id, content, metadata) for doc_id, content, metadata in batch}.values())
+        ids = [doc_id for doc_id, _, _ in batch]
+        stored = collection.get(ids=ids, include=["metadatas"])
+        stored_metadata = dict(zip(stored["ids"], stored["metadatas"]))
+
+        changed, metadata_only = [], []
+        for doc_id, content, metadata in batch:
+            metadata = {**metadata, CONTENT_HASH_KEY: document_hash(content, model_name)}
+            previous = stored_metadata.get(doc_id)
+            if previous is None or previous.get(CONTENT_HASH_KEY) != metadata[CONTENT_HASH_KEY]:
+                changed.append((doc_id, content, metadata))
+            elif previous != metadata:
+                metadata_only.append((doc_id, metadata))
+        seen_ids.update(ids)
+
+        if changed:
+            changed_ids, documents, metadatas = (list(column) for column in zip(*changed))
+            encode_started_at = time.perf_counter()
+            embeddings = embed(documents, model_name)
+            stats["encode_seconds"] += time.perf_counter() - encode_started_at
+
+            upsert_started_at = time.perf_counter()
+            collection.upsert(ids=changed_ids, embeddings=embeddings.tolist(), metadatas=metadatas,
+                              documents=documents)
+            stats["upsert_seconds"] += time.perf_counter() - upsert_started_at
+        if metadata_only:
+            collection.update(ids=[doc_id for doc_id, _ in metadata_only],
+                              metadatas=[metadata for _, metadata in metadata_only])
+
+        stats["records"] += len(batch)
+        stats["embedded"] += len(changed)
+        stats["metadata_updated"] += len(metadata_only)
+        stats["unchanged"] += len(batch) - len(changed) - len(metadata_only)
+        stats["batches"] += 1
+        print(f"  ✓ {collection.name}: {stats['records']} records checked, {stats['embedded']} embedded",
+              flush=True)
+
+    if callable(delete_missing):
+        delete_missing = delete_missing()
+        if not delete_missing:
+            print(f"⚠️  {collection.name}: fetch incomplete, no records deleted")
+    # An empty input is more likely a failed fetch than an emptied dataset: keep the collection
+    if delete_missing and seen_ids:
+        missing = [doc_id for doc_id in collection.get(include=[])["ids"] if doc_id not in seen_ids]
+        for chunk in batched(missing, batch_size):
+            collection.delete(ids=chunk)
+        stats["deleted"] = len(missing)
+
+    stats["elapsed_seconds"] = time.perf_counter() - started_at
+    report_indexing(collection.name, stats)
+    return stats
+
+
+def report_indexing(name, stats):
+    """Prints the change counts and embedding / write throughput of an index_records run."""
+    print(f"📦 {name}: {stats['records']} records in {stats['batches']} batches, {stats['elapsed_seconds']:.1f}s")
+    print(f"  - Embedded (new or changed): {stats['embedded']}, metadata only: {stats['metadata_updated']}, "
+          f"unchanged: {stats['unchanged']}, deleted: {stats['deleted']}")
+    if stats["embedded"]:
+        print(f"  - {stats['embedded'] / stats['encode_seconds']:,.0f} embeddings/sec, "
+              f"upserts {stats['upsert_seconds']:.1f}s")
@@ -35,6 +35,7 @@ class GraphState(TypedDict):
     
     # Summarization outputs
     summaries: dict  # {conversation_id: summary}
+    near_duplicates: dict  # {conversation_id: representative conversation_id} of clustered conversations
     
     # Tagging outputs
     tagged_conversations_df: object  # pandas DataFrame with tags
@@ -42,30 +43,111 @@ class GraphState(TypedDict):
     # Metadata
     tag_definitions: dict
     total_conversations: int
+    summary_level_timings: dict  # {level: {"calls", "conversations", "mean_seconds", "max_seconds"}}
+    summary_routes: dict  # Conversations per summarization route {"trivial", "duplicate", "short", "long"}
     status: str
 
+    # Incremental sync
+    incremental: bool  # Only fetch conversations changed since the last run
+    sync_state: dict  # Updated sync state, saved once the results are written
+
+    # Checkpointing (see checkpoints.py)
+    resume: bool  # Reuse the outputs and results stored by an interrupted run
+
 
 # Import required modules
 import pandas as pd
 import sys
 import os
 from help_functions import (
-    threads_prep, group_threads, get_conversations_by_inbox, get_threads_by_inbox, extract_tags
+    threads_prep, group_threads, iter_conversations_with_threads_by_inbox, extract_tags
 )
-from bs4 import BeautifulSoup
 import ast
-import re
-import spacy
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tqdm.auto import tqdm
-from lm_studio import llm_call
+from lm_studio import llm_call, llm_map
+from llm_cache import llm_cache
+from tag_retrieval import TagRetriever
+from embeddings import get_embedding_service
+from checkpoints import workflow_checkpoint
+from near_duplicates import cluster_near_duplicates, NEAR_DUPLICATE_THRESHOLD
+from text_processing import (
+    clean_message, iter_normalize_texts, html_process_pool, strip_html_many, estimate_tokens,
+    chunk_conversation, count_tokens, content_hash
+)
+from sync_state import (
+    load_sync_state, save_sync_state, incremental_query, conversation_changed, record_conversations
+)
+
+# spaCy normalization: texts per nlp.pipe batch and worker processes
+SPACY_BATCH_SIZE = 256
+SPACY_N_PROCESS = 1
+
+# HTML-to-text conversion: backend ("stream", "lxml" or "bs4") and worker processes
+HTML_BACKEND = "stream"
+HTML_N_PROCESS = 1
+
+# Request threads inline with the conversation listing (embed=threads)
+# instead of one threads request per conversation
+EMBED_THREADS = True
+
+# Summarization: LLM requests in flight at once. Ollama only serves them in parallel
+# up to OLLAMA_NUM_PARALLEL (LM Studio: "Max concurrent predictions"), so keep them aligned
+SUMMARY_MAX_WORKERS = 4
+# Token budget per summarization call: longer conversations are split between messages
+# into chunks of this size, each repeating up to SUMMARY_CHUNK_OVERLAP_TOKENS of the
+# previous chunk. Leaves room for the prompt and the answer in Ollama's default 2048 context
+SUMMARY_CHUNK_TOKENS = 1500
+SUMMARY_CHUNK_OVERLAP_TOKENS = 100
+# LONG conversations are reduced as a tree: each combine call merges at most this many
+# partial summaries (and at most SUMMARY_CHUNK_TOKENS), level by level, until one is left
+SUMMARY_COMBINE_FAN_IN = 4
+# Conversations of at most this many tokens (about the length of a summary) are used
+# as their own summary, without an LLM call
+SUMMARY_SKIP_TOKENS = 64
+# Near-duplicate conversations (word 3-gram Jaccard >= NEAR_DUPLICATE_THRESHOLD) are grouped
+# before summarization: one conversation per cluster is summarized and tagged for all of them
+CLUSTER_NEAR_DUPLICATES = True
+
+# Tagging: requests in flight at once (async client) and caps on the streamed answer,
+# which is only a short comma-separated list of tag names
+TAGGING_CONCURRENCY = 4
+TAG_RESPONSE_MAX_CHARS = 300
+TAG_NUM_PREDICT = 100
+# Conversations per batched tagging prompt (the tag catalogue is sent once per batch);
+# 1 sends one prompt per conversation. Batched prompts carry the summary plus the
+# first TAG_BATCH_TEXT_CHARS characters of the conversation
+TAG_BATCH_SIZE = 8
+TAG_BATCH_TEXT_CHARS = 500
+# "llm": the LLM picks the tags among the TAG_SHORTLIST_K tags closest to the summary
+# (embedding pre-filter; 0 sends the whole catalogue). "embedding": no LLM call, the
+# TAG_EMBEDDING_MAX_TAGS closest tags scoring at least TAG_EMBEDDING_MIN_SCORE are used
+TAGGING_MODE = "llm"
+TAG_SHORTLIST_K = 10
+TAG_EMBEDDING_MAX_TAGS = 3
+TAG_EMBEDDING_MIN_SCORE = 0.3
+# Tags are checkpointed after every slice of this many conversations
+TAG_CHECKPOINT_EVERY = 256
+TAGS_EXCEL_PATH = 'support_files/Help Scout tags.xlsx'
 
-# Load spaCy model
-nlp = spacy.load("en_core_web_sm")
+# Streaming mode (--stream): conversations waiting between two stages, and tagging
+# micro-batches (flushed when full or when no summary arrived for a few seconds)
+STREAM_QUEUE_SIZE = 64
+STREAM_TAG_BATCH_SIZE = TAG_BATCH_SIZE * TAGGING_CONCURRENCY
+STREAM_TAG_FLUSH_SECONDS = 2.0
 
 # ========================
 # Node Functions
 # ========================
 
+MAILBOX_ID = '294254'  # Same mailbox ID as etl.py
+
+
 def etl_node(state: GraphState) -> GraphState:
     """
     ETL Node: Extract, Transform, Load data from HelpScout API.
@@ -75,178 +157,542 @@ def etl_node(state: GraphState) -> GraphState:
     print("ETL NODE: Starting data extraction and processing")
     print("="*50)
     
+    if state.get("resume"):
+        outputs = workflow_checkpoint.load_node("etl")
+        if outputs is not None:
+            print(f"✓ ETL loaded from checkpoint: {outputs['total_conversations']} conversations")
+            return {**state, **outputs, "status": "etl_complete"}
+    
     # Get conversations and threads from API
     print("Fetching data from HelpScout API...")
-    mailbox_id = '294254'  # Same mailbox ID as etl.py
-    conversations = get_conversations_by_inbox(mailbox_id)
-    threads = get_threads_by_inbox(mailbox_id)
+    sync_state, query, conversation_filter = _etl_sync_setup(state)
     
-    # Process conversations
-    df_conversations = pd.DataFrame(conversations)
-    df_conversations['tags_list'] = df_conversations['tags'].apply(
-        lambda x: extract_tags(ast.literal_eval(x)) if isinstance(x, str) else extract_tags(x)
-    )
+    print("Cleaning and normalizing threads...")
+    conversations, listing = [], {}
+    normalized_threads = list(iter_normalized_mailbox_threads(query, conversation_filter, conversations, listing))
+    df_conversations = _conversations_frame(conversations, sync_state, listing)
     
-    # Clean threads HTML
-    cleaned_threads = []
-    for thread in threads:
-        cleaned_thread = thread.copy()
-        if 'body' in cleaned_thread and cleaned_thread['body']:
-            soup = BeautifulSoup(cleaned_thread['body'], 'html.parser')
-            cleaned_thread['body'] = soup.get_text(separator=' ', strip=True)
-        cleaned_threads.append(cleaned_thread)
-    
-    # Filter threads
-    filtered_threads = threads_prep(cleaned_threads)
-    df_filtered_threads = pd.DataFrame(filtered_threads)
-    
-    # Normalize text
-    print("Normalizing text...")
-    df_filtered_threads['normalized'] = df_filtered_threads.apply(
-        lambda row: process_message_row(row), axis=1
-    )
-    
-    # Group threads by conversation
-    threads_by_convo = group_threads(df_filtered_threads)
-    
-    print(f"✓ ETL complete: {len(threads_by_convo)} conversations processed")
+    if normalized_threads:
+        # Group threads by conversation
+        threads_by_convo = group_threads(pd.DataFrame(normalized_threads))
+        print(f"✓ ETL complete: {len(threads_by_convo)} conversations processed")
+    else:
+        threads_by_convo = {}
+        print("✓ ETL complete: no new or changed conversations")
     
-    return {
-        **state,
+    outputs = {
         "conversations_df": df_conversations,
         "threads_by_convo": threads_by_convo,
         "total_conversations": len(threads_by_convo),
+        "sync_state": sync_state,
+    }
+    workflow_checkpoint.save_node("etl", outputs)
+    
+    return {
+        **state,
+        **outputs,
         "status": "etl_complete"
     }
 
 
-def process_message_row(row):
-    """Helper function to clean and normalize message text."""
-    try:
-        body = str(row['body'])
-        no_sig = remove_signature(body)
-        clean = clean_body(no_sig)
-        norm = spacy_normalize(clean)
-        return norm
-    except Exception:
-        return ""
-
-
-def clean_body(text: str) -> str:
-    """Remove URLs, emails, phones, line breaks and extra spaces."""
-    text = str(text)
-    text = re.sub(r"https?://\S+", "", text)
-    text = re.sub(r"[\w\.-]+@[\w\.-]+", "", text)
-    text = re.sub(r"\(?\d{2,3}\)?[\s-]?\d{3,5}[\s-]?\d{4}", "", text)
-    text = re.sub(r"\s{2,}", " ", text)
-    text = text.replace("\n", " ").replace("\r", "")
-    return text.strip()
-
-
-def remove_signature(text: str) -> str:
-    """Remove email signatures using patterns and farewell words."""
-    text = str(text)
-    farewell_words = (
-        r"best|regards|kind regards|warm regards|sincerely|thanks|thank you|cheers|respectfully|"
-        r"yours truly|yours sincerely|yours faithfully|take care|atenciosamente|obrigado|agradeço|abs"
-    )
-    common_titles = (
-        r"manager|analyst|engineer|developer|designer|director|ceo|cto|founder|consultant|"
-        r"coordinator|president|gerente|assistant|controller|accountant"
-    )
-    pattern = (
-        rf"(?i)(?:^|\n)[ \t]*({farewell_words})[^\n]*\n"
-        rf"(?:.*({common_titles}).*\n*){{0,3}}"
-    )
-    text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
-    return text.strip()
+def _etl_sync_setup(state):
+    """Returns (sync_state, query, conversation_filter) for the mailbox listing (all None for a full sync)."""
+    if not state.get("incremental"):
+        return None, None, None
+    sync_state = load_sync_state()
+    query = incremental_query(sync_state, MAILBOX_ID)
+    print(f"Incremental sync: {query or 'no watermark yet, listing the whole mailbox'}")
+    return sync_state, query, lambda conv: conversation_changed(sync_state, MAILBOX_ID, conv)
+
+
+def iter_normalized_mailbox_threads(query, conversation_filter, conversations, listing):
+    """
+    Single pass over the mailbox, streamed page by page: each page's threads are
+    cleaned, filtered and normalized before the next page is pulled, so only one
+    page of raw HTML is held in memory at a time. Yields normalized threads, in
+    page order and grouped by conversation; every fetched conversation is
+    appended to `conversations`, and `listing` tells whether the listing completed.
+    
+    Incremental syncs (with a `conversation_filter`) list by ascending modifiedAt
+    and without the page limit, so the sync watermark can move past every change.
+    """
+    incremental = conversation_filter is not None
+    
+    def thread_pages():
+        pages = iter_conversations_with_threads_by_inbox(
+            MAILBOX_ID, query=query, conversation_filter=conversation_filter, embed_threads=EMBED_THREADS,
+            sort_field="modifiedAt" if incremental else None, max_pages=None if incremental else 100,
+            listing=listing
+        )
+        for page_conversations, page_threads in pages:
+            conversations.extend(page_conversations)
+            yield page_threads
+    
+    with html_process_pool(HTML_N_PROCESS) as html_executor:
+        prepared_pages = iter_prepared_threads(thread_pages(), executor=html_executor)
+        yield from iter_normalized_threads(prepared_pages)
 
 
-def spacy_normalize(text: str) -> str:
-    """Lemmatize and remove punctuation and stopwords using spaCy."""
-    doc = nlp(text)
-    tokens = [token.lemma_ for token in doc if not token.is_punct and not token.is_stop]
-    return " ".join(tokens)
+def _conversations_frame(conversations, sync_state, listing):
+    """Records the fetched conversations in the sync state and returns them as a DataFrame."""
+    if sync_state is not None:
+        record_conversations(
+            sync_state, MAILBOX_ID, conversations,
+            complete=listing.get("complete", False), failed_ids=listing.get("failed_conversations", ())
+        )
+    
+    df_conversations = pd.DataFrame(conversations)
+    if 'tags' in df_conversations:
+        df_conversations['tags_list'] = df_conversations['tags'].apply(
+            lambda x: extract_tags(ast.literal_eval(x)) if isinstance(x, str) else extract_tags(x)
+        )
+    return df_conversations
+
+
+def iter_prepared_threads(thread_pages, backend=HTML_BACKEND, executor=None):
+    """
+    Streaming transform: converts the HTML of each page of raw threads to text
+    (optionally on a process pool) and keeps only the message types used
+    downstream (threads_prep). Yields one page at a time.
+    """
+    for threads in thread_pages:
+        with_body = [thread for thread in threads if thread.get('body')]
+        texts = strip_html_many([thread['body'] for thread in with_body], backend=backend, executor=executor)
+        for thread, text in zip(with_body, texts):
+            thread['body'] = text
+        yield threads_prep(threads)
+
+
+def iter_normalized_threads(prepared_pages, batch_size=SPACY_BATCH_SIZE, n_process=SPACY_N_PROCESS):
+    """
+    Streaming transform: removes signatures and noise from each prepared thread,
+    normalizes the texts in spaCy batches (nlp.pipe) and yields each thread
+    without its body, keeping only the fields group_threads needs.
+    """
+    def cleaned_texts():
+        for threads in prepared_pages:
+            for thread in threads:
+                yield clean_message(thread.pop('body')), thread
+
+    for normalized, thread in iter_normalize_texts(cleaned_texts(), batch_size=batch_size, n_process=n_process):
+        thread['normalized'] = normalized
+        yield thread
+
+
+def iter_grouped_conversations(normalized_threads):
+    """
+    Streaming group_threads: yields (conversation_id, text) as soon as the last
+    thread of a conversation has passed. Relies on the threads of a conversation
+    arriving together, as iter_normalized_mailbox_threads produces them.
+    """
+    conversation = []
+    for thread in normalized_threads:
+        if conversation and thread['conversation_id'] != conversation[0]['conversation_id']:
+            yield from group_threads(pd.DataFrame(conversation)).items()
+            conversation = []
+        conversation.append(thread)
+    if conversation:
+        yield from group_threads(pd.DataFrame(conversation)).items()
+
+
+def cluster_node(state: GraphState) -> GraphState:
+    """
+    Near-duplicate clustering (MinHash + LSH, see near_duplicates.py).
+    The first conversation of each cluster is its representative; summarization and
+    tagging handle the representative and copy the result to the other members.
+    """
+    print("\n" + "="*50)
+    print("CLUSTERING NODE: Grouping near-duplicate conversations")
+    print("="*50)
+    
+    if not CLUSTER_NEAR_DUPLICATES:
+        print("Skipped (CLUSTER_NEAR_DUPLICATES = False)")
+        return {**state, "near_duplicates": {}}
+    
+    near_duplicates = cluster_near_duplicates(state["threads_by_convo"], NEAR_DUPLICATE_THRESHOLD)
+    return {
+        **state,
+        "near_duplicates": near_duplicates,
+        "status": "clustering_complete"
+    }
 
 
 def summarize_node(state: GraphState) -> GraphState:
     """
     Adaptive Summarization Node.
     Evaluates each conversation individually and applies the appropriate strategy:
-    - SHORT: Direct summarization for texts <= 2000 characters
-    - LONG: Chunking + recombination for texts > 2000 characters
+    - TRIVIAL: Texts <= SUMMARY_SKIP_TOKENS tokens are kept as their own summary (no LLM call)
+    - DUPLICATE: Same message bodies as another conversation, or in the same near-duplicate
+      cluster (cluster_node); the first one is summarized and its summary is reused
+    - SHORT: Direct summarization for texts <= SUMMARY_CHUNK_TOKENS tokens
+    - LONG: Chunking on message boundaries + tree-reduce recombination for longer texts
+    (see ConcurrentSummarizer)
     """
     print("\n" + "="*50)
     print("SUMMARIZATION NODE: Starting adaptive summarization")
     print("="*50)
     
     threads = state["threads_by_convo"]
-    summaries = {}
-    threshold = 2000
     
-    # Statistics
-    short_count = 0
-    long_count = 0
+    # Summaries finished by an interrupted run are reused
+    checkpointed = workflow_checkpoint.load_items("summary") if state.get("resume") else {}
+    results = {conv_id: checkpointed[str(conv_id)] for conv_id in threads if str(conv_id) in checkpointed}
+    if results:
+        print(f"✓ Resumed {len(results)} summaries from checkpoint")
     
-    for i, (conv_id, texto) in enumerate(threads.items(), 1):
-        text_length = len(texto)
-        print(f"Processing {i}/{len(threads)} (ID: {conv_id}, length: {text_length} chars)")
-        
-        # Individual decision per conversation
-        if text_length <= threshold:
-            # SHORT strategy: direct summarization
-            print(f"  → Using SHORT strategy")
-            summary = summarize_llm_call(texto)
-            summaries[conv_id] = summary
-            short_count += 1
-        else:
-            # LONG strategy: chunking + recombination
-            print(f"  → Using LONG strategy")
-            chunks = [texto[i:i + threshold] for i in range(0, len(texto), threshold)]
-            print(f"  Split into {len(chunks)} chunks")
-            
-            # Summarize each chunk
-            partial_summaries = []
-            for j, chunk in enumerate(chunks, 1):
-                print(f"    Processing chunk {j}/{len(chunks)}")
-                chunk_summary = summarize_llm_call(chunk)
-                partial_summaries.append(chunk_summary)
-            
-            # Combine partial summaries if needed
-            if len(partial_summaries) > 1:
-                combined_text = "\n\n".join(partial_summaries)
-                final_prompt = f"""Create a comprehensive summary by combining these partial summaries:
-
-{combined_text}
-
-Provide a unified summary focusing on:
-- Main issue or request
-- Key decisions made
-- Actions taken or planned
-- Current status
-
-Final Summary:"""
-                
-                summary = llm_call(final_prompt, "You are a helpful assistant that creates comprehensive summaries.")
-                summaries[conv_id] = summary.strip() if summary else "Unable to generate summary"
-            else:
-                summaries[conv_id] = partial_summaries[0]
-            
-            long_count += 1
-        
-        print(f"✓ Completed conversation {conv_id}")
+    pending = [(conv_id, texto) for conv_id, texto in threads.items() if conv_id not in results]
+    summarizer = ConcurrentSummarizer(duplicate_of=state.get("near_duplicates"))
+    for conv_id, summary in results.items():
+        summarizer.seed(conv_id, threads[conv_id], summary)
+    for conv_id, summary in summarizer.summarize(pending, total=len(pending)):
+        results[conv_id] = summary
+        workflow_checkpoint.save_item("summary", conv_id, summary)
+    
+    # Same order as threads_by_convo, whatever the completion order
+    summaries = {conv_id: results[conv_id] for conv_id in threads}
     
     print(f"\n✓ Summarization complete: {len(summaries)} summaries generated")
-    print(f"  - SHORT strategy: {short_count} conversations")
-    print(f"  - LONG strategy: {long_count} conversations")
+    if checkpointed:
+        print(f"  - From checkpoint: {len(summaries) - len(pending)} conversations")
+    summarizer.report()
+    llm_cache.report()
     
     return {
         **state,
         "summaries": summaries,
+        "summary_level_timings": summarizer.level_timings(),
+        "summary_routes": summarizer.routes(),
         "status": "summarization_complete"
     }
 
 
+# Markers passed through the streaming queues
+_END = object()
+_EMPTY = object()
+
+
+class _BackgroundIterator:
+    """
+    Consumes an iterable on a daemon thread and hands its items over through a
+    bounded queue, so a slow producer (e.g. the ETL generator) runs alongside
+    the consumer and is held back when the consumer falls behind.
+    """
+
+    def __init__(self, iterable, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stopped = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(iterable,), daemon=True)
+        self.thread.start()
+
+    def _run(self, iterable):
+        try:
+            for item in iterable:
+                if not self._put(item):
+                    break
+        except BaseException as e:
+            self.error = e
+        finally:
+            # A generator can only be closed by the thread running it: when the consumer
+            # stops early, close it here so its own cleanup (finally blocks, connections) runs
+            if self.stopped.is_set() and hasattr(iterable, "close"):
+                iterable.close()
+        self._put(_END)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, block):
+        """Next item; _EMPTY if none is ready (block=False), _END once the iterable is exhausted."""
+        try:
+            item = self.queue.get(block=block)
+        except queue.Empty:
+            return _EMPTY
+        if item is _END and self.error is not None:
+            raise self.error
+        return item
+
+    def close(self):
+        """Stops the producer; the iterable is closed on its thread once the current item is produced."""
+        self.stopped.set()
+
+
+class ConcurrentSummarizer:
+    """
+    Summarizes conversations with SUMMARY_MAX_WORKERS LLM requests in flight.
+
+    Each conversation is routed on its token count and content hash: TRIVIAL
+    ones need no summary, DUPLICATE ones reuse (or wait for) the summary of the
+    first conversation with the same message bodies (or of the same near-duplicate
+    cluster, when `duplicate_of` maps conversations to their cluster representative),
+    SHORT conversations are one call, and LONG ones are chunked and then reduced as
+    a tree: when every job of a level is done, its summaries are combined in
+    groups of at most SUMMARY_COMBINE_FAN_IN (the next level), queued ahead of
+    the remaining work, until a single summary is left.
+
+    `summarize()` pulls (conversation_id, text) pairs from any iterable, including
+    a generator that is still producing them (the streaming ETL), through a
+    bounded queue, and yields (conversation_id, summary) as each conversation
+    finishes. Statistics accumulate on the instance (see report()).
+    """
+
+    def __init__(self, max_workers=SUMMARY_MAX_WORKERS, queue_size=None, duplicate_of=None):
+        self.max_workers = max_workers
+        self.queue_size = queue_size or max_workers * 2
+        self.duplicate_of = duplicate_of or {}  # {conv_id: cluster representative}
+        self.trivial_count = 0
+        self.duplicate_count = 0
+        self.short_count = 0
+        self.long_count = 0
+        self.llm_calls = 0  # requests sent to the model
+        self.cache_hits = 0  # requests answered by llm_cache
+        self.elapsed = 0.0
+        self.level_durations = {}  # {level: [seconds per conversation]}
+        self.level_calls = {}  # {level: LLM calls}
+        self.conversation_durations = {}
+        self._reductions = {}  # {conv_id: {"level", "results", "pending", "level_started_at"}} for LONG conversations
+        self._started_at = {}
+        self._summaries_by_hash = {}  # {content hash: summary} of finished conversations
+        self._leaders = {}  # {conv_id: content hash or cluster} of conversations being summarized
+        self._followers = {}  # {content hash or cluster: [conv_id]} duplicates waiting for that summary
+        self._model_conversations = set()  # conversations that needed at least one model call
+
+    def _digest(self, conv_id, texto):
+        """Key shared by a conversation and its duplicates: its near-duplicate cluster, else its content hash."""
+        representative = self.duplicate_of.get(conv_id)
+        return f"cluster:{representative}" if representative is not None else content_hash(texto)
+
+    def seed(self, conv_id, texto, summary):
+        """Registers a summary finished earlier (e.g. by an interrupted run), so the conversation's duplicates reuse it."""
+        self._summaries_by_hash.setdefault(self._digest(conv_id, texto), summary)
+
+    def _plan(self, conv_id, texto):
+        """
+        Routes a new conversation. Returns (jobs, ready): `ready` lists the (conv_id, summary)
+        pairs that need no LLM call. Jobs are (conv_id, step, payload); step is None for a
+        SHORT summary and (level, index) for LONG conversations: level 0 summarizes a chunk
+        (text), higher levels combine a group of summaries from the level below (list).
+        """
+        tokens = count_tokens(texto)
+        if tokens <= SUMMARY_SKIP_TOKENS:
+            self.trivial_count += 1
+            return [], [(conv_id, texto)]
+        
+        digest = self._digest(conv_id, texto)
+        if digest in self._summaries_by_hash:
+            self.duplicate_count += 1
+            return [], [(conv_id, self._summaries_by_hash[digest])]
+        if digest in self._followers:
+            self.duplicate_count += 1
+            self._followers[digest].append(conv_id)
+            return [], []
+        self._followers[digest] = []
+        self._leaders[conv_id] = digest
+        
+        if tokens <= SUMMARY_CHUNK_TOKENS:
+            self.short_count += 1
+            return [(conv_id, None, texto)], []
+        chunks = chunk_conversation(texto, SUMMARY_CHUNK_TOKENS, SUMMARY_CHUNK_OVERLAP_TOKENS)
+        self.long_count += 1
+        self._reductions[conv_id] = {
+            "level": 0, "results": [None] * len(chunks), "pending": len(chunks), "level_started_at": None
+        }
+        return [(conv_id, (0, j), chunk) for j, chunk in enumerate(chunks)], []
+
+    def _completed(self, conv_id, summary):
+        """(conv_id, summary) pairs finished with this conversation: itself and its duplicates."""
+        digest = self._leaders.pop(conv_id)
+        self._summaries_by_hash[digest] = summary
+        return [(conv_id, summary)] + [(duplicate, summary) for duplicate in self._followers.pop(digest)]
+
+    def _finish(self, conv_id, step, summary, jobs):
+        """Records a finished job; returns the conversation's summary once it is complete, else None."""
+        now = time.perf_counter()
+        if step is None:
+            self.conversation_durations[conv_id] = now - self._started_at.pop(conv_id)
+            return summary
+        
+        level, index = step
+        reduction = self._reductions[conv_id]
+        reduction["results"][index] = summary
+        reduction["pending"] -= 1
+        if reduction["pending"]:
+            return None
+        
+        # Level finished for this conversation
+        self.level_durations.setdefault(level, []).append(now - reduction["level_started_at"])
+        summaries_below = reduction["results"]
+        if len(summaries_below) == 1:
+            del self._reductions[conv_id]
+            self.conversation_durations[conv_id] = now - self._started_at.pop(conv_id)
+            return summaries_below[0]
+        
+        # Next level: groups run in parallel; a group of one is carried over as is
+        groups = group_for_combine(summaries_below)
+        reduction.update(level=level + 1, results=[None] * len(groups), pending=0, level_started_at=now)
+        next_jobs = []
+        for j, group in enumerate(groups):
+            if len(group) == 1:
+                reduction["results"][j] = group[0]
+            else:
+                next_jobs.append((conv_id, (level + 1, j), group))
+        reduction["pending"] = len(next_jobs)
+        jobs.extendleft(reversed(next_jobs))
+        return None
+
+    def summarize(self, conversations, total=None):
+        """
+        Args:
+            conversations (iterable): (conversation_id, text) pairs
+            total (int, optional): Number of conversations, for the progress bar
+
+        Yields:
+            tuple: (conversation_id, summary), in completion order
+        """
+        capacity = self.max_workers * 2
+        source = _BackgroundIterator(conversations, self.queue_size)
+        source_done = False
+        jobs = deque()
+        in_flight = {}
+        started_at = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                    tqdm(total=total, desc="Summarizing") as progress:
+                while True:
+                    # Take new conversations while the pool has room; wait for one only when idle
+                    while not source_done and len(jobs) + len(in_flight) < capacity:
+                        item = source.get(block=not jobs and not in_flight)
+                        if item is _EMPTY:
+                            break
+                        if item is _END:
+                            source_done = True
+                            break
+                        new_jobs, ready = self._plan(*item)
+                        jobs.extend(new_jobs)
+                        for conv_id, summary in ready:
+                            progress.update(1)
+                            yield conv_id, summary
+                    if source_done and not jobs and not in_flight:
+                        break
+                    
+                    # Keep the pool busy without queueing every job up front, so that
+                    # combine levels pushed to the front of `jobs` start right away
+                    while jobs and len(in_flight) < capacity:
+                        job = jobs.popleft()
+                        now = time.perf_counter()
+                        self._started_at.setdefault(job[0], now)
+                        if job[1] is not None and self._reductions[job[0]]["level_started_at"] is None:
+                            self._reductions[job[0]]["level_started_at"] = now
+                        in_flight[executor.submit(_run_summary_job, *job[1:])] = job
+                    if not in_flight:
+                        continue
+                    
+                    # While the source is still producing, wake up regularly to take new conversations
+                    done, _ = wait(in_flight, timeout=None if source_done else 0.05, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        conv_id, step, _ = in_flight.pop(future)
+                        result, cache_hits, model_calls = future.result()
+                        self.cache_hits += cache_hits
+                        self.llm_calls += model_calls
+                        if model_calls:
+                            self._model_conversations.add(conv_id)
+                        if step is not None:
+                            self.level_calls[step[0]] = self.level_calls.get(step[0], 0) + model_calls
+                        summary = self._finish(conv_id, step, result, jobs)
+                        if summary is None:
+                            continue
+                        for finished_id, finished_summary in self._completed(conv_id, summary):
+                            progress.update(1)
+                            yield finished_id, finished_summary
+        finally:
+            source.close()
+            self.elapsed += time.perf_counter() - started_at
+
+    def routes(self):
+        """Conversations sent down each route."""
+        return {
+            "trivial": self.trivial_count,
+            "duplicate": self.duplicate_count,
+            "short": self.short_count,
+            "long": self.long_count,
+        }
+
+    def level_timings(self):
+        """Per tree level: LLM calls, conversations, mean and max seconds from level start to end."""
+        return {
+            level: {
+                "calls": self.level_calls.get(level, 0),
+                "conversations": len(durations),
+                "mean_seconds": round(sum(durations) / len(durations), 2),
+                "max_seconds": round(max(durations), 2),
+            }
+            for level, durations in sorted(self.level_durations.items())
+        }
+
+    def report(self):
+        """Prints the strategy counts, tree level timings and throughput."""
+        print(f"  - TRIVIAL (kept as is, no LLM call): {self.trivial_count} conversations")
+        print(f"  - DUPLICATE (summary reused): {self.duplicate_count} conversations")
+        print(f"  - SHORT strategy: {self.short_count} conversations")
+        print(f"  - LONG strategy: {self.long_count} conversations")
+        for level, timing in self.level_timings().items():
+            label = "chunks" if level == 0 else "combine"
+            print(f"    · level {level} ({label}): {timing['calls']} calls over {timing['conversations']} "
+                  f"conversations, mean {timing['mean_seconds']}s, max {timing['max_seconds']}s")
+        if self.conversation_durations:
+            slowest = max(self.conversation_durations, key=self.conversation_durations.get)
+            print(f"  - Slowest conversation: {slowest} ({self.conversation_durations[slowest]:.1f}s)")
+        if self.elapsed > 0:
+            rate = len(self._model_conversations) / self.elapsed * 60
+            print(f"  - {self.llm_calls} LLM calls (+{self.cache_hits} answered from the cache) in {self.elapsed:.1f}s"
+                  + (f" ({rate:.1f} conversations/min through the model)" if rate else ""))
+
+
+def group_for_combine(summaries, fan_in=SUMMARY_COMBINE_FAN_IN, max_tokens=SUMMARY_CHUNK_TOKENS):
+    """
+    Split partial summaries into consecutive groups for the next combine level:
+    at most `fan_in` summaries and about `max_tokens` tokens per group.
+    Always merges at least pairs, so every level reduces the number of summaries.
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    for summary in summaries:
+        tokens = count_tokens(summary)
+        if current and (len(current) >= fan_in or current_tokens + tokens > max_tokens):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(summary)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    
+    if len(groups) == len(summaries):
+        # Every summary is larger than half the budget: combine them two by two anyway
+        groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+    return groups
+
+
+def _run_summary_job(step, payload):
+    """
+    Runs one summarization job: a conversation or chunk (text), or a combine step (list of summaries).
+    Returns (summary, cache hits, model calls), counted on this worker thread.
+    """
+    hits, misses = llm_cache.thread_counts()
+    if step is None or step[0] == 0:
+        summary = summarize_llm_call(payload)
+    else:
+        summary = combine_summaries_llm_call(payload)
+    hits_after, misses_after = llm_cache.thread_counts()
+    return summary, hits_after - hits, misses_after - misses
+
+
 def summarize_llm_call(text, system_prompt="You are a helpful assistant that summarizes customer support conversations."):
     """Summarize text using Ollama LLM."""
     user_prompt = f"""Please provide a concise summary of the following customer support conversation, focusing on:
@@ -267,6 +713,31 @@ Summary:"""
         return f"Error generating summary: {str(e)}"
 
 
+def combine_summaries_llm_call(partial_summaries, system_prompt="You are a helpful assistant that creates comprehensive summaries."):
+    """Combine the chunk summaries of a long conversation into a single summary."""
+    if len(partial_summaries) == 1:
+        return partial_summaries[0]
+    
+    combined_text = "\n\n".join(partial_summaries)
+    final_prompt = f"""Create a comprehensive summary by combining these partial summaries:
+
+{combined_text}
+
+Provide a unified summary focusing on:
+- Main issue or request
+- Key decisions made
+- Actions taken or planned
+- Current status
+
+Final Summary:"""
+    
+    try:
+        summary = llm_call(final_prompt, system_prompt)
+        return summary.strip() if summary else "Unable to generate summary"
+    except Exception as e:
+        return f"Error generating summary: {str(e)}"
+
+
 def tagging_node(state: GraphState) -> GraphState:
     """
     Tagging Node: Assigns tags to conversations based on content and summary.
@@ -276,8 +747,7 @@ def tagging_node(state: GraphState) -> GraphState:
     print("="*50)
     
     # Load tag definitions
-    tags_excel_path = 'support_files/Help Scout tags.xlsx'
-    tag_definitions = load_tag_definitions(tags_excel_path)
+    tag_definitions = load_tag_definitions(TAGS_EXCEL_PATH)
     
     if not tag_definitions:
         print("Warning: No tag definitions found")
@@ -299,19 +769,65 @@ def tagging_node(state: GraphState) -> GraphState:
     # Add suggested tags
     df_results['suggested_tags'] = ''
     
-    for i, row in enumerate(df_results.itertuples(), 1):
-        print(f"Tagging {i}/{len(df_results)} (ID: {row.conversation_id})")
+    retriever = None
+    if tag_definitions and not df_results.empty:
+        conversations = list(df_results[['conversation_id', 'texto_completo', 'summary']].itertuples(index=False))
         
-        suggested_tags = suggest_tags_for_conversation(
-            row.texto_completo, row.summary, tag_definitions
-        )
+        # Tags finished by an interrupted run are reused
+        checkpointed = workflow_checkpoint.load_items("tags") if state.get("resume") else {}
+        tags_by_id = {
+            conv_id: checkpointed[str(conv_id)] for conv_id, _, _ in conversations if str(conv_id) in checkpointed
+        }
+        # Near-duplicates are tagged through their cluster representative
+        near_duplicates = state.get("near_duplicates") or {}
+        pending = [
+            conversation for conversation in conversations
+            if conversation[0] not in tags_by_id and near_duplicates.get(conversation[0], conversation[0]) == conversation[0]
+        ]
+        if tags_by_id:
+            print(f"✓ Resumed {len(tags_by_id)} tag lists from checkpoint")
+        
+        retriever = tag_retriever(tag_definitions) if pending else None
         
-        tag_string = ', '.join(suggested_tags)
-        df_results.at[i-1, 'suggested_tags'] = tag_string
+        hits_before, misses_before = llm_cache.hits, llm_cache.misses
+        model_conversations, model_elapsed = 0, 0.0
+        for i in range(0, len(pending), TAG_CHECKPOINT_EVERY):
+            batch = pending[i:i + TAG_CHECKPOINT_EVERY]
+            batch_started_at, batch_misses = time.perf_counter(), llm_cache.misses
+            batch_tags, _ = tag_conversations(batch, tag_definitions, retriever)
+            # Slices answered entirely from the cache are left out of the throughput
+            if llm_cache.misses > batch_misses:
+                model_conversations += len(batch)
+                model_elapsed += time.perf_counter() - batch_started_at
+            workflow_checkpoint.save_items("tags", batch_tags)
+            tags_by_id.update(batch_tags)
+        llm_calls, cache_hits = llm_cache.misses - misses_before, llm_cache.hits - hits_before
         
-        print(f"✓ Tags: {tag_string}")
+        copied = {
+            conv_id: tags_by_id[representative] for conv_id, representative in near_duplicates.items()
+            if conv_id not in tags_by_id and representative in tags_by_id
+        }
+        if copied:
+            workflow_checkpoint.save_items("tags", copied)
+            tags_by_id.update(copied)
+            print(f"✓ Tags copied to {len(copied)} near-duplicate conversations")
+        
+        df_results['suggested_tags'] = [
+            ', '.join(tags_by_id.get(conv_id, [])) for conv_id in df_results['conversation_id']
+        ]
+        for conv_id, tag_string in zip(df_results['conversation_id'], df_results['suggested_tags']):
+            print(f"✓ {conv_id}: {tag_string}")
+        
+        if llm_calls or cache_hits:
+            print(f"  - {llm_calls} LLM calls (+{cache_hits} answered from the cache)")
+        if model_elapsed > 0:
+            print(f"  - {model_conversations} conversations tagged by the model in {model_elapsed:.1f}s "
+                  f"({model_conversations / model_elapsed * 60:.1f} conversations/min)")
     
     print(f"✓ Tagging complete: {len(df_results)} conversations tagged")
+    llm_cache.report()
+    if retriever is not None:
+        get_embedding_service(retriever.model_name).report()
     
     return {
         **state,
@@ -321,6 +837,13 @@ def tagging_node(state: GraphState) -> GraphState:
     }
 
 
+def tag_retriever(tag_definitions):
+    """TagRetriever for the configured tagging mode, or None when no embedding step is needed."""
+    if TAGGING_MODE == "embedding" or 0 < TAG_SHORTLIST_K < len(tag_definitions):
+        return TagRetriever(tag_definitions)
+    return None
+
+
 def load_tag_definitions(excel_path):
     """Load tag definitions from Excel file."""
     try:
@@ -333,19 +856,17 @@ def load_tag_definitions(excel_path):
         return {}
 
 
-def suggest_tags_for_conversation(conversation_text, summary, tag_definitions, max_tags=3):
-    """Use LLM to suggest tags for a conversation."""
-    if not tag_definitions:
-        return []
-    
+TAGGING_SYSTEM_PROMPT = "You are a helpful assistant that analyzes customer support conversations and assigns the most relevant tags."
+
+
+def build_tagging_prompt(conversation_text, summary, tag_definitions, max_tags=3):
+    """Build the user prompt that asks the LLM for up to `max_tags` tags."""
     formatted_tags = "\n".join([f"- {tag}: {desc}" for tag, desc in tag_definitions.items()])
     
     # Truncate conversation text
     truncated_text = conversation_text[:2000] if len(conversation_text) > 2000 else conversation_text
     
-    system_prompt = "You are a helpful assistant that analyzes customer support conversations and assigns the most relevant tags."
-    
-    user_prompt = f"""Analyze this customer support conversation and suggest up to {max_tags} most relevant tags.
+    return f"""Analyze this customer support conversation and suggest up to {max_tags} most relevant tags.
 
 CONVERSATION SUMMARY:
 {summary}
@@ -357,17 +878,436 @@ AVAILABLE TAGS:
 {formatted_tags}
 
 Return ONLY the tag names as a comma-separated list. Example: "tag1, tag2, tag3"""
+
+
+def parse_suggested_tags(response, tag_definitions):
+    """Keep the tags of a comma-separated LLM answer that exist in `tag_definitions`."""
+    suggested_tags = [tag.strip() for tag in (response or "").split(',')]
+    return [tag for tag in suggested_tags if tag in tag_definitions]
+
+
+def _retrieval_text(text, summary):
+    """Text matched against the tag descriptions: the summary, or the conversation when there is none."""
+    if summary and not summary.startswith(("Unable to generate summary", "Error generating summary")):
+        return summary
+    return text[:2000]
+
+
+def _candidate_definitions(tag_definitions, candidates, conv_ids):
+    """Tag definitions restricted to the shortlisted tags of `conv_ids` (all tags when there is no shortlist)."""
+    if candidates is None:
+        return tag_definitions
+    tags = dict.fromkeys(tag for conv_id in conv_ids for tag in candidates[conv_id])
+    return {tag: tag_definitions[tag] for tag in tags}
+
+
+def tag_conversations(conversations, tag_definitions, retriever=None):
+    """
+    Tag conversations according to TAGGING_MODE (see the constants at the top).
+
+    Args:
+        conversations (list): (conversation_id, texto_completo, summary) tuples
+        tag_definitions (dict): {tag: description}
+        retriever (TagRetriever, optional): Reused between calls; built here when needed
+
+    Returns:
+        tuple: ({conversation_id: [tags]}, number of LLM calls)
+    """
+    use_shortlist = 0 < TAG_SHORTLIST_K < len(tag_definitions)
+    if TAGGING_MODE != "embedding" and not use_shortlist:
+        candidates = None
+    else:
+        retriever = retriever or TagRetriever(tag_definitions)
+        texts = [_retrieval_text(text, summary) for _, text, summary in conversations]
+        if TAGGING_MODE == "embedding":
+            matches = retriever.top_k(texts, TAG_EMBEDDING_MAX_TAGS, TAG_EMBEDDING_MIN_SCORE)
+            print(f"  - Embedding tagging: {len(conversations)} conversations, no LLM calls")
+            return {
+                conv_id: [tag for tag, _ in conv_matches]
+                for (conv_id, _, _), conv_matches in zip(conversations, matches)
+            }, 0
+        shortlists = retriever.shortlist(texts, TAG_SHORTLIST_K)
+        candidates = {conv_id: tags for (conv_id, _, _), tags in zip(conversations, shortlists)}
+        print(f"  - Tag pre-filter: {TAG_SHORTLIST_K} of {len(tag_definitions)} tags per conversation")
+
+    if TAG_BATCH_SIZE > 1:
+        return tag_conversations_batched(conversations, tag_definitions, TAG_BATCH_SIZE, candidates)
+    return tag_conversations_single(conversations, tag_definitions, candidates), len(conversations)
+
+
+def tag_conversations_single(conversations, tag_definitions, candidates=None):
+    """
+    One tagging prompt per conversation, sent concurrently through llm_map.
+
+    Args:
+        conversations (list): (conversation_id, texto_completo, summary) tuples
+        tag_definitions (dict): {tag: description}
+        candidates (dict, optional): {conversation_id: [tags]} shortlist shown in each prompt
+
+    Returns:
+        dict: {conversation_id: [tags]}
+    """
+    prompts = [
+        build_tagging_prompt(text, summary, _candidate_definitions(tag_definitions, candidates, [conv_id]))
+        for conv_id, text, summary in conversations
+    ]
+    responses = llm_map(
+        prompts, TAGGING_SYSTEM_PROMPT, concurrency=TAGGING_CONCURRENCY,
+        max_chars=TAG_RESPONSE_MAX_CHARS, num_predict=TAG_NUM_PREDICT
+    )
+    return {
+        conv_id: parse_suggested_tags(response, tag_definitions)
+        for (conv_id, _, _), response in zip(conversations, responses)
+    }
+
+
+def build_batch_tagging_prompt(conversations, tag_definitions, max_tags=3):
+    """Build one prompt that asks for the tags of several conversations, with the tag list sent once."""
+    formatted_tags = "\n".join([f"- {tag}: {desc}" for tag, desc in tag_definitions.items()])
+    formatted_conversations = "\n\n".join(
+        f"### CONVERSATION {conv_id}\nSUMMARY:\n{summary}\n"
+        f"TEXT (may be truncated):\n{text[:TAG_BATCH_TEXT_CHARS]}"
+        for conv_id, text, summary in conversations
+    )
+    
+    return f"""Analyze each of the following customer support conversations and suggest up to {max_tags} most relevant tags for each one.
+
+AVAILABLE TAGS:
+{formatted_tags}
+
+{formatted_conversations}
+
+Return ONLY a JSON object that maps every conversation ID above to a list of tag names, for example:
+{{"123": ["tag1", "tag2"], "456": ["tag3"]}}"""
+
+
+# Decodes the first JSON object of the answer and ignores what follows it
+# (models sometimes wrap the JSON in text or code fences)
+JSON_DECODER = json.JSONDecoder()
+
+
+def first_json_object(text):
+    """The first `{...}` in `text` that decodes as a JSON object, or None."""
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict):
+            return data
+        start = text.find("{", start + 1)
+    return None
+
+
+def parse_batch_tagging_response(response, conversation_ids, tag_definitions):
+    """
+    Read the JSON answer of a batched tagging prompt.
+
+    Returns:
+        dict: {conversation_id: [tags]} for the conversations found in the answer
+              (empty if the answer is not valid JSON)
+    """
+    data = first_json_object(response or "")
+    if data is None:
+        return {}
+    
+    data = {str(key).strip(): value for key, value in data.items()}
+    tags_by_id = {}
+    for conv_id in conversation_ids:
+        tags = data.get(str(conv_id))
+        if isinstance(tags, str):
+            tags = tags.split(',')
+        if isinstance(tags, list):
+            tags_by_id[conv_id] = [
+                tag.strip() for tag in tags if isinstance(tag, str) and tag.strip() in tag_definitions
+            ]
+    return tags_by_id
+
+
+def tag_conversations_batched(conversations, tag_definitions, batch_size=TAG_BATCH_SIZE, candidates=None):
+    """
+    Tag conversations `batch_size` at a time with one JSON prompt per batch.
+    Conversations missing from an answer (or whose batch answer cannot be
+    parsed) are tagged again with single-conversation prompts.
+
+    Args:
+        conversations (list): (conversation_id, texto_completo, summary) tuples
+        tag_definitions (dict): {tag: description}
+        batch_size (int): Conversations per prompt
+        candidates (dict, optional): {conversation_id: [tags]}; a batch prompt lists
+            the union of the shortlists of its conversations
+
+    Returns:
+        tuple: ({conversation_id: [tags]}, number of LLM calls)
+    """
+    batches = [conversations[i:i + batch_size] for i in range(0, len(conversations), batch_size)]
+    prompts = [
+        build_batch_tagging_prompt(
+            batch, _candidate_definitions(tag_definitions, candidates, [conv_id for conv_id, _, _ in batch])
+        )
+        for batch in batches
+    ]
+    responses = llm_map(
+        prompts, TAGGING_SYSTEM_PROMPT, concurrency=TAGGING_CONCURRENCY,
+        num_predict=TAG_NUM_PREDICT * batch_size
+    )
+    
+    tags_by_id = {}
+    fallback = []
+    for batch, response in zip(batches, responses):
+        parsed = parse_batch_tagging_response(response, [conv_id for conv_id, _, _ in batch], tag_definitions)
+        tags_by_id.update(parsed)
+        fallback.extend(conversation for conversation in batch if conversation[0] not in parsed)
+    
+    if fallback:
+        print(f"  ⚠️  {len(fallback)} conversations missing from the batched answers, tagging them one by one")
+        tags_by_id.update(tag_conversations_single(fallback, tag_definitions, candidates))
+    
+    # Prompt size compared with one prompt per conversation (estimated tokens)
+    system_tokens = estimate_tokens(TAGGING_SYSTEM_PROMPT)
+    single_tokens = sum(
+        system_tokens + estimate_tokens(build_tagging_prompt(text, summary, tag_definitions))
+        for _, text, summary in conversations
+    )
+    sent_tokens = sum(system_tokens + estimate_tokens(prompt) for prompt in prompts) + sum(
+        system_tokens + estimate_tokens(
+            build_tagging_prompt(text, summary, _candidate_definitions(tag_definitions, candidates, [conv_id]))
+        )
+        for conv_id, text, summary in fallback
+    )
+    saved = single_tokens - sent_tokens
+    print(f"  - Batched tagging: {len(conversations)} conversations in {len(prompts)} prompts "
+          f"(+{len(fallback)} fallback calls)")
+    print(f"  - Prompt tokens: ~{sent_tokens:,} sent vs ~{single_tokens:,} one per conversation "
+          f"with the full tag list (~{saved:,} saved, {saved / single_tokens:.0%})")
+    
+    return tags_by_id, len(prompts) + len(fallback)
+
+
+def suggest_tags_for_conversation(conversation_text, summary, tag_definitions, max_tags=3):
+    """Use LLM to suggest tags for a conversation."""
+    if not tag_definitions:
+        return []
+    
+    user_prompt = build_tagging_prompt(conversation_text, summary, tag_definitions, max_tags)
     
     try:
-        response = llm_call(user_prompt, system_prompt)
-        suggested_tags = [tag.strip() for tag in response.split(',')]
-        valid_tags = [tag for tag in suggested_tags if tag in tag_definitions]
-        return valid_tags
+        response = llm_call(user_prompt, TAGGING_SYSTEM_PROMPT)
+        return parse_suggested_tags(response, tag_definitions)
     except Exception as e:
         print(f"Error suggesting tags: {str(e)}")
         return []
 
 
+# ========================
+# Streaming execution
+# ========================
+
+class _StreamingTagger:
+    """
+    Tagging stage of run_streaming: receives summarized conversations through a
+    bounded queue and tags them in micro-batches on its own thread.
+    """
+
+    def __init__(self, tag_definitions, retriever, batch_size=STREAM_TAG_BATCH_SIZE,
+                 flush_seconds=STREAM_TAG_FLUSH_SECONDS, maxsize=STREAM_QUEUE_SIZE):
+        self.tag_definitions = tag_definitions
+        self.retriever = retriever
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.tags_by_id = {}
+        self.finished_at = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, conv_id, texto, summary):
+        self._put((conv_id, texto, summary))
+
+    def _put(self, item):
+        # Blocks while the tagger is behind (backpressure), but not on a tagger that died
+        while True:
+            if self.error is not None:
+                raise self.error
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=self.flush_seconds if batch else None)
+                except queue.Empty:
+                    item = _EMPTY  # no new summaries for a while: tag what is waiting
+                if item is _END:
+                    break
+                if item is not _EMPTY:
+                    batch.append(item)
+                if batch and (item is _EMPTY or len(batch) >= self.batch_size):
+                    self._tag(batch)
+                    batch = []
+            if batch:
+                self._tag(batch)
+        except BaseException as e:
+            self.error = e
+        self.finished_at = time.perf_counter()
+
+    def _tag(self, batch):
+        if self.tag_definitions:
+            tags, _ = tag_conversations(batch, self.tag_definitions, self.retriever)
+        else:
+            tags = {conv_id: [] for conv_id, _, _ in batch}
+        workflow_checkpoint.save_items("tags", tags)
+        self.tags_by_id.update(tags)
+
+    def close(self):
+        """Tags the remaining conversations and waits for the stage to finish."""
+        self._put(_END)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def run_streaming(state: GraphState) -> GraphState:
+    """
+    Streaming execution of the workflow (--stream), instead of app.invoke.
+
+    The graph runs its nodes one after the other over the whole mailbox. Here a
+    conversation goes to the summarizer as soon as its threads are normalized,
+    and to tagging as soon as it is summarized. The ETL (network + spaCy),
+    summarization and tagging (LLM) run at the same time, connected by bounded
+    queues, so the total time approaches that of the slowest stage instead of
+    the sum of the three. Checkpoints and --resume work as in the graph.
+    Near-duplicate clustering needs the whole mailbox, so only exact duplicates
+    share a summary here.
+
+    Returns:
+        dict: The same final state as app.invoke
+    """
+    print("\n" + "="*50)
+    print("STREAMING MODE: ETL → summarize → tagging pipelined")
+    print("="*50)
+    
+    started_at = time.perf_counter()
+    hits_before, misses_before = llm_cache.hits, llm_cache.misses
+    tag_definitions = load_tag_definitions(TAGS_EXCEL_PATH)
+    if not tag_definitions:
+        print("Warning: No tag definitions found")
+        tag_definitions = {}
+    
+    resume = state.get("resume")
+    checkpointed_summaries = workflow_checkpoint.load_items("summary") if resume else {}
+    checkpointed_tags = workflow_checkpoint.load_items("tags") if resume else {}
+    etl_outputs = workflow_checkpoint.load_node("etl") if resume else None
+    
+    # Stage 1 (ETL): conversations as their threads are normalized, or from the checkpoint
+    conversations, listing = [], {}
+    sync_state = None
+    if etl_outputs is not None:
+        print(f"✓ ETL loaded from checkpoint: {etl_outputs['total_conversations']} conversations")
+        source = iter(etl_outputs["threads_by_convo"].items())
+    else:
+        print("Fetching data from HelpScout API...")
+        sync_state, query, conversation_filter = _etl_sync_setup(state)
+        source = iter_grouped_conversations(
+            iter_normalized_mailbox_threads(query, conversation_filter, conversations, listing)
+        )
+    
+    threads_by_convo = {}
+    summaries = {}
+    tagger = _StreamingTagger(tag_definitions, tag_retriever(tag_definitions) if tag_definitions else None)
+    etl_finished_at = None
+    
+    def to_summarize():
+        # Runs on the summarizer's feeder thread, alongside the LLM calls
+        nonlocal etl_finished_at
+        for conv_id, texto in source:
+            threads_by_convo[conv_id] = texto
+            if str(conv_id) in checkpointed_summaries:
+                summaries[conv_id] = checkpointed_summaries[str(conv_id)]
+                summarizer.seed(conv_id, texto, summaries[conv_id])
+                if str(conv_id) not in checkpointed_tags:
+                    tagger.put(conv_id, texto, summaries[conv_id])
+                continue
+            yield conv_id, texto
+        etl_finished_at = time.perf_counter()
+    
+    # Stage 2 (summarize) on this thread; stage 3 (tagging) on the tagger's thread
+    summarizer = ConcurrentSummarizer(queue_size=STREAM_QUEUE_SIZE)
+    try:
+        for conv_id, summary in summarizer.summarize(to_summarize()):
+            summaries[conv_id] = summary
+            workflow_checkpoint.save_item("summary", conv_id, summary)
+            if str(conv_id) not in checkpointed_tags:
+                tagger.put(conv_id, threads_by_convo[conv_id], summary)
+        summarized_at = time.perf_counter()
+    finally:
+        tagger.close()
+    
+    if etl_outputs is not None:
+        df_conversations, sync_state = etl_outputs["conversations_df"], etl_outputs["sync_state"]
+    else:
+        df_conversations = _conversations_frame(conversations, sync_state, listing)
+        workflow_checkpoint.save_node("etl", {
+            "conversations_df": df_conversations,
+            "threads_by_convo": threads_by_convo,
+            "total_conversations": len(threads_by_convo),
+            "sync_state": sync_state,
+        })
+    
+    # Outputs in ETL order, as the graph produces them
+    summaries = {conv_id: summaries[conv_id] for conv_id in threads_by_convo}
+    df_results = pd.DataFrame([
+        {
+            "conversation_id": conv_id,
+            "texto_completo": texto,
+            "summary": summaries[conv_id],
+            "suggested_tags": ', '.join(
+                tagger.tags_by_id[conv_id] if conv_id in tagger.tags_by_id
+                else checkpointed_tags.get(str(conv_id), [])
+            ),
+        }
+        for conv_id, texto in threads_by_convo.items()
+    ])
+    
+    def at(moment):
+        return f"{moment - started_at:.1f}s" if moment else "-"
+    
+    print(f"\n✓ Streaming run complete: {len(threads_by_convo)} conversations")
+    print(f"  - ETL finished at {at(etl_finished_at)}, summaries at {at(summarized_at)}, "
+          f"tags at {at(tagger.finished_at)}")
+    if checkpointed_summaries or checkpointed_tags:
+        print(f"  - From checkpoint: {len(checkpointed_summaries)} summaries, {len(checkpointed_tags)} tag lists")
+    summarizer.report()
+    # The summarizer counts its own lookups; the rest of the run's lookups are tagging's
+    tag_calls = llm_cache.misses - misses_before - summarizer.llm_calls
+    tag_hits = llm_cache.hits - hits_before - summarizer.cache_hits
+    print(f"  - Tagging: {tag_calls} LLM calls (+{tag_hits} answered from the cache)")
+    llm_cache.report()
+    if tagger.retriever is not None:
+        get_embedding_service(tagger.retriever.model_name).report()
+    
+    return {
+        **state,
+        "conversations_df": df_conversations,
+        "threads_by_convo": threads_by_convo,
+        "summaries": summaries,
+        "summary_level_timings": summarizer.level_timings(),
+        "summary_routes": summarizer.routes(),
+        "tagged_conversations_df": df_results,
+        "tag_definitions": tag_definitions,
+        "total_conversations": len(threads_by_convo),
+        "sync_state": sync_state,
+        "status": "complete"
+    }
+
+
 #%%
 # Initialize the graph with the state schema
 graph = StateGraph(GraphState) 
@@ -375,12 +1315,14 @@ graph = StateGraph(GraphState)
 
 # Add nodes with actual functions
 graph.add_node("etl", etl_node)
+graph.add_node("cluster", cluster_node)
 graph.add_node("summarize", summarize_node)
 graph.add_node("tagging", tagging_node)
 
 # Add edges - simple linear flow
 graph.add_edge(START, "etl")
-graph.add_edge("etl", "summarize")
+graph.add_edge("etl", "cluster")
+graph.add_edge("cluster", "summarize")
 graph.add_edge("summarize", "tagging")
 graph.add_edge("tagging", END)
 
@@ -397,6 +1339,25 @@ except Exception as e:
 # %%
 # Run the workflow
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="HelpScout tickets agent workflow")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process conversations changed since the last run")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Call the LLM even when a cached response exists (responses are still stored)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run from its checkpoint (data/workflow_checkpoint.sqlite)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Run ETL, summarization and tagging as a pipeline instead of one node after the other")
+    parser.add_argument("--tag-mode", choices=["llm", "embedding"], default=TAGGING_MODE,
+                        help="'embedding' assigns the nearest tags without calling the LLM")
+    args, _ = parser.parse_known_args()
+    llm_cache.bypass = llm_cache.bypass or args.no_cache
+    TAGGING_MODE = args.tag_mode
+    if not args.resume:
+        workflow_checkpoint.clear()
+
     print("\n" + "="*70)
     print("HELPSCOUT TICKETS AGENT WORKFLOW")
     print("="*70)
@@ -406,20 +1367,38 @@ if __name__ == "__main__":
         "conversations_df": None,
         "threads_by_convo": {},
         "summaries": {},
+        "near_duplicates": {},
         "tagged_conversations_df": None,
         "tag_definitions": {},
         "total_conversations": 0,
+        "summary_level_timings": {},
+        "summary_routes": {},
+        "incremental": args.incremental,
+        "sync_state": None,
+        "resume": args.resume,
         "status": "initialized"
     }
     
     # Run the workflow
     print("\nStarting workflow execution...\n")
-    final_state = app.invoke(initial_state)
+    final_state = run_streaming(initial_state) if args.stream else app.invoke(initial_state)
     
     # Save final results
     if final_state["tagged_conversations_df"] is not None:
         output_path = 'data/final_tagged_conversations.csv'
-        final_state["tagged_conversations_df"].to_csv(output_path, index=False)
+        results_df = final_state["tagged_conversations_df"]
+        if final_state.get("incremental") and os.path.exists(output_path):
+            # Replace the rows of re-processed conversations, keep the rest
+            previous_df = pd.read_csv(output_path)
+            if not results_df.empty:
+                previous_df = previous_df[~previous_df['conversation_id'].isin(results_df['conversation_id'])]
+            results_df = pd.concat([previous_df, results_df], ignore_index=True)
+        results_df.to_csv(output_path, index=False)
+        if final_state.get("sync_state") is not None:
+            save_sync_state(final_state["sync_state"])
+            print("✓ Sync state saved")
+        # The run is complete: a later --resume must not reload its outputs
+        workflow_checkpoint.clear()
         print(f"\n" + "="*70)
         print(f"✓ WORKFLOW COMPLETE!")
         print(f"✓ Results saved to: {output_path}")